@@ -21,7 +21,6 @@ create table if not exists public.topics (
   position_x real,
   position_y real,
   expanded boolean default false,
-  notes text default '',
   created_at timestamp with time zone default timezone('utc'::text, now()) not null,
   updated_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
@@ -154,4 +153,179 @@ create index if not exists news_summaries_created_at_idx on public.news_summarie
 -- Trigger for updated_at on news_summaries
 create trigger handle_news_summaries_updated_at
   before update on public.news_summaries
-  for each row execute function public.handle_updated_at();
\ No newline at end of file
+  for each row execute function public.handle_updated_at();
+
+-- Precomputed news digests, one per normalized topic name, shared across users
+create table if not exists public.news_digests (
+  topic_key text primary key, -- Lowercased, whitespace-collapsed topic name
+  topic text not null,
+  summary_markdown text not null,
+  raw_results jsonb,
+  refreshed_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+-- Digests hold no user data; they are written by the backend scheduler only
+alter table public.news_digests enable row level security;
+
+create policy "Authenticated users can view news digests" on public.news_digests
+  for select using (auth.role() = 'authenticated');
+
+create index if not exists news_digests_refreshed_at_idx on public.news_digests(refreshed_at);
+
+-- Distinct topic names across all users that have no digest refreshed since p_fresh_after.
+-- The key must match normalize_topic() in news_scheduler.py: whitespace collapsed, lowercased.
+create or replace function public.stale_news_topics(
+  p_fresh_after timestamp with time zone,
+  p_limit integer default 20
+)
+returns table (
+  topic_key text,
+  topic text
+)
+language sql stable as $$
+  select keys.topic_key, min(keys.name)
+  from (
+    select lower(btrim(regexp_replace(t.name, '\s+', ' ', 'g'))) as topic_key, t.name
+    from public.topics t
+  ) keys
+  where keys.topic_key <> ''
+    and not exists (
+      select 1 from public.news_digests d
+      where d.topic_key = keys.topic_key and d.refreshed_at >= p_fresh_after
+    )
+  group by keys.topic_key
+  order by keys.topic_key
+  limit p_limit;
+$$;
+
+-- Job deduplication for news_summaries: Idempotency-Key header and normalized topic set
+alter table public.news_summaries add column if not exists idempotency_key text;
+alter table public.news_summaries add column if not exists topics_key text;
+
+create unique index if not exists news_summaries_idempotency_key_idx
+  on public.news_summaries(user_id, idempotency_key) where idempotency_key is not null;
+create index if not exists news_summaries_topics_key_idx
+  on public.news_summaries(user_id, topics_key, status);
+
+-- Topic notes, stored apart from the graph so saving the graph never rewrites note bodies
+create table if not exists public.topic_notes (
+  topic_id uuid references public.topics(id) on delete cascade primary key,
+  user_id uuid references public.user_profiles(id) on delete cascade not null,
+  body text not null default '',
+  version integer not null default 1, -- Optimistic concurrency: writers must present the current version
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+alter table public.topic_notes enable row level security;
+
+create policy "Users can view own topic notes" on public.topic_notes
+  for select using (auth.uid() = user_id);
+
+create policy "Users can insert own topic notes" on public.topic_notes
+  for insert with check (auth.uid() = user_id);
+
+create policy "Users can update own topic notes" on public.topic_notes
+  for update using (auth.uid() = user_id);
+
+create policy "Users can delete own topic notes" on public.topic_notes
+  for delete using (auth.uid() = user_id);
+
+create index if not exists topic_notes_user_id_idx on public.topic_notes(user_id);
+
+create trigger handle_topic_notes_updated_at
+  before update on public.topic_notes
+  for each row execute function public.handle_updated_at();
+
+-- Migrate notes from schemas that stored them inline on topics
+do $$
+begin
+  if exists (
+    select 1 from information_schema.columns
+    where table_schema = 'public' and table_name = 'topics' and column_name = 'notes'
+  ) then
+    insert into public.topic_notes (topic_id, user_id, body)
+      select id, user_id, notes from public.topics where coalesce(notes, '') <> ''
+      on conflict (topic_id) do nothing;
+    -- The old search vector was generated from notes
+    alter table public.topics drop column if exists search_vector;
+    alter table public.topics drop column notes;
+  end if;
+end $$;
+
+-- Staged graph imports tag the topics they write, so replacing a graph is a server-side delete
+alter table public.topics add column if not exists import_id uuid;
+
+create index if not exists topics_import_id_idx on public.topics(user_id, import_id);
+
+-- Full-text search over topic names, topic notes and news summaries
+create extension if not exists btree_gin;
+
+alter table public.topics add column if not exists search_vector tsvector
+  generated always as (setweight(to_tsvector('english', coalesce(name, '')), 'A')) stored;
+
+alter table public.topic_notes add column if not exists search_vector tsvector
+  generated always as (setweight(to_tsvector('english', coalesce(body, '')), 'B')) stored;
+
+alter table public.news_summaries add column if not exists search_vector tsvector
+  generated always as (to_tsvector('english', coalesce(summary_markdown, ''))) stored;
+
+-- Composite GIN indexes so the per-user filter and the text match use one index scan
+create index if not exists topics_search_idx on public.topics using gin(user_id, search_vector);
+create index if not exists topic_notes_search_idx on public.topic_notes using gin(user_id, search_vector);
+create index if not exists news_summaries_search_idx on public.news_summaries using gin(user_id, search_vector);
+
+-- Ranked, paginated search for one user. Snippets are only generated for the returned page.
+create or replace function public.search_user_content(
+  p_user_id uuid,
+  p_query text,
+  p_limit integer default 20,
+  p_offset integer default 0
+)
+returns table (
+  kind text,
+  id uuid,
+  title text,
+  snippet text,
+  rank real,
+  created_at timestamp with time zone,
+  total_count bigint
+)
+language sql stable as $$
+  with q as (
+    select websearch_to_tsquery('english', p_query) as query
+  ),
+  topic_ids as (
+    select t.id from public.topics t, q
+    where t.user_id = p_user_id and t.search_vector @@ q.query
+    union
+    select n.topic_id from public.topic_notes n, q
+    where n.user_id = p_user_id and n.search_vector @@ q.query
+  ),
+  hits as (
+    select 'topic'::text as kind, t.id, t.name as title, coalesce(n.body, '') as body,
+           ts_rank_cd(t.search_vector || coalesce(n.search_vector, ''::tsvector), q.query) as rank,
+           greatest(t.updated_at, n.updated_at) as created_at
+    from topic_ids
+    join public.topics t on t.id = topic_ids.id
+    left join public.topic_notes n on n.topic_id = t.id
+    cross join q
+    union all
+    select 'news_summary'::text, n.id, array_to_string(n.topics, ', '), n.summary_markdown,
+           ts_rank_cd(n.search_vector, q.query), n.created_at
+    from public.news_summaries n, q
+    where n.user_id = p_user_id and n.status = 'completed' and n.search_vector @@ q.query
+  ),
+  page as (
+    select hits.*, count(*) over () as total_count
+    from hits
+    order by hits.rank desc, hits.created_at desc
+    limit p_limit offset p_offset
+  )
+  select page.kind, page.id, page.title,
+         ts_headline('english', page.body, q.query,
+                     'MaxFragments=2, MaxWords=20, MinWords=8, FragmentDelimiter=" ... ", StartSel=**, StopSel=**'),
+         page.rank, page.created_at, page.total_count
+  from page, q
+  order by page.rank desc, page.created_at desc;
+$$;
@@ -0,0 +1,210 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, List
+
+EXPORT_FORMAT_VERSION = 1
+TOPIC_FIELDS = ('id', 'name', 'color', 'size', 'position_x', 'position_y', 'expanded')
+# Bulk upserts need the same columns on every row
+TOPIC_DEFAULTS = {'color': '#8b5cf6', 'size': 5, 'position_x': None, 'position_y': None, 'expanded': False}
+# Ids per `in` filter, keeping request URLs short
+ID_LOOKUP_CHUNK = 100
+
+
+class GraphImportError(ValueError):
+    """Raised for a malformed line in an import stream"""
+
+    def __init__(self, line_number: int, message: str):
+        self.line_number = line_number
+        super().__init__(f"line {line_number}: {message}")
+
+
+def _keyset_pages(connection: Callable[[], ContextManager], query_factory, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Page through a table ordered by id without OFFSET, so late pages stay cheap
+
+    A client is borrowed from `connection()` for each page only, not while the caller
+    consumes it.
+    """
+    last_id = None
+    while True:
+        with connection() as supabase:
+            query = query_factory(supabase)
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            rows = query.order('id').limit(batch_size).execute().data
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def _notes_for(supabase, user_id: str, topic_ids: List[str]) -> Dict[str, str]:
+    notes = {}
+    for start in range(0, len(topic_ids), ID_LOOKUP_CHUNK):
+        chunk = topic_ids[start:start + ID_LOOKUP_CHUNK]
+        rows = supabase.table('topic_notes').select('topic_id, body').eq('user_id', user_id).in_('topic_id', chunk).execute().data
+        notes.update((row['topic_id'], row['body']) for row in rows)
+    return notes
+
+
+def export_graph(connection: Callable[[], ContextManager], user_id: str, batch_size: int = 500) -> Iterator[str]:
+    """Yield a user's graph as NDJSON lines: a header, then topics, then relationships
+
+    `connection` (e.g. SupabasePool.connection) is entered once per batch, so a slow
+    download does not hold a pooled client between batches.
+    """
+    yield json.dumps({
+        'type': 'header',
+        'version': EXPORT_FORMAT_VERSION,
+        'exported_at': datetime.now(timezone.utc).isoformat(),
+    }) + '\n'
+
+    topic_query = lambda supabase: supabase.table('topics').select(', '.join(TOPIC_FIELDS)).eq('user_id', user_id)
+    for rows in _keyset_pages(connection, topic_query, batch_size):
+        with connection() as supabase:
+            notes = _notes_for(supabase, user_id, [row['id'] for row in rows])
+        yield ''.join(json.dumps({'type': 'topic', **row, 'notes': notes.get(row['id'], '')}) + '\n' for row in rows)
+
+    relationship_query = lambda supabase: supabase.table('topic_relationships').select('id, source_topic_id, target_topic_id').eq('user_id', user_id)
+    for rows in _keyset_pages(connection, relationship_query, batch_size):
+        yield ''.join(
+            json.dumps({'type': 'relationship', 'source': row['source_topic_id'], 'target': row['target_topic_id']}) + '\n'
+            for row in rows
+        )
+
+
+class GraphImporter:
+    """Writes an NDJSON graph stream in bounded batches
+
+    Topic ids are kept so relationships resolve, except where an id already belongs to
+    another user; those are remapped. Only the remapped ids are held in memory.
+
+    With replace=True the import is staged: every topic is written under a new id derived
+    from the import id and tagged with that import id, so the existing graph is untouched
+    while the stream is written and no per-topic state is kept in memory. Once the whole
+    stream has been written, the user's untagged topics are deleted by a server-side
+    filter; if the import fails, its tagged topics are deleted instead. This is not
+    atomic; a failure during either delete can leave both graphs, or part of the staged
+    one, in place.
+    """
+
+    def __init__(self, supabase, user_id: str, batch_size: int = 500, replace: bool = False):
+        self.supabase = supabase
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.replace = replace
+        self.import_id = str(uuid.uuid4()) if replace else None
+        self.topics: List[Dict[str, Any]] = []
+        self.notes: Dict[str, str] = {}
+        self.relationships: List[Dict[str, Any]] = []
+        self.remapped: Dict[str, str] = {}
+        self.counts = {'topics': 0, 'relationships': 0}
+
+    def topic_id(self, imported_id: str) -> str:
+        """The id an imported topic id is written under"""
+        if self.replace:
+            return str(uuid.uuid5(uuid.UUID(self.import_id), imported_id))
+        return self.remapped.get(imported_id, imported_id)
+
+    def run(self, lines: Iterable[bytes]) -> Dict[str, int]:
+        if not self.replace:
+            return self.write(lines)
+
+        try:
+            counts = self.write(lines)
+        except Exception:
+            try:
+                # Relationships and notes cascade with their topics
+                self.supabase.table('topics').delete().eq('user_id', self.user_id).eq('import_id', self.import_id).execute()
+                self.counts = {'topics': 0, 'relationships': 0}
+            except Exception as e:
+                print(f"Failed to remove staged topics after a failed import: {e}")
+            raise
+        self.supabase.table('topics').delete().eq('user_id', self.user_id).or_(
+            f"import_id.is.null,import_id.neq.{self.import_id}"
+        ).execute()
+        return counts
+
+    def write(self, lines: Iterable[bytes]) -> Dict[str, int]:
+        for line_number, raw in enumerate(lines, start=1):
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise GraphImportError(line_number, f"invalid JSON ({e})")
+            if not isinstance(item, dict):
+                raise GraphImportError(line_number, "expected a JSON object")
+
+            kind = item.get('type')
+            if kind == 'topic':
+                self.add_topic(line_number, item)
+            elif kind == 'relationship':
+                self.add_relationship(line_number, item)
+            elif kind != 'header':
+                raise GraphImportError(line_number, f"unknown type {kind!r}")
+
+        self.flush_topics()
+        self.flush_relationships()
+        return self.counts
+
+    def add_topic(self, line_number: int, item: Dict[str, Any]):
+        if not item.get('id') or not item.get('name'):
+            raise GraphImportError(line_number, "topic requires id and name")
+        topic = {field: item.get(field, TOPIC_DEFAULTS.get(field)) for field in TOPIC_FIELDS}
+        topic['user_id'] = self.user_id
+        if self.replace:
+            topic['import_id'] = self.import_id
+        self.topics.append(topic)
+        if item.get('notes'):
+            self.notes[topic['id']] = item['notes']
+        if len(self.topics) >= self.batch_size:
+            self.flush_topics()
+
+    def add_relationship(self, line_number: int, item: Dict[str, Any]):
+        if not item.get('source') or not item.get('target'):
+            raise GraphImportError(line_number, "relationship requires source and target")
+        self.relationships.append({'source': item['source'], 'target': item['target']})
+        if len(self.relationships) >= self.batch_size:
+            self.flush_relationships()
+
+    def flush_topics(self):
+        if not self.topics:
+            return
+        ids = [topic['id'] for topic in self.topics]
+        # Staged (replace) imports already use fresh ids, which cannot belong to anyone else
+        for start in range(0, 0 if self.replace else len(ids), ID_LOOKUP_CHUNK):
+            chunk = ids[start:start + ID_LOOKUP_CHUNK]
+            foreign = self.supabase.table('topics').select('id').in_('id', chunk).neq('user_id', self.user_id).execute().data
+            for row in foreign:
+                self.remapped[row['id']] = str(uuid.uuid4())
+        for topic in self.topics:
+            topic['id'] = self.topic_id(topic['id'])
+
+        self.supabase.table('topics').upsert(self.topics, on_conflict='id').execute()
+        if self.notes:
+            self.supabase.table('topic_notes').upsert([{
+                'topic_id': self.topic_id(topic_id),
+                'user_id': self.user_id,
+                'body': body,
+            } for topic_id, body in self.notes.items()], on_conflict='topic_id').execute()
+        self.counts['topics'] += len(self.topics)
+        self.topics = []
+        self.notes = {}
+
+    def flush_relationships(self):
+        if not self.relationships:
+            return
+        # Relationships may point at topics still waiting in the current batch
+        self.flush_topics()
+        rows = [{
+            'user_id': self.user_id,
+            'source_topic_id': self.topic_id(rel['source']),
+            'target_topic_id': self.topic_id(rel['target']),
+        } for rel in self.relationships]
+        self.supabase.table('topic_relationships').upsert(rows, on_conflict='source_topic_id,target_topic_id').execute()
+        self.counts['relationships'] += len(rows)
+        self.relationships = []
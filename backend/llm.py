@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import anthropic
+
+from rate_limit import Overloaded, UpstreamLimiter
+
+DEFAULT_FALLBACK_MODEL = "claude-3-5-haiku-20241022"
+
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when no attempt produced a response before the endpoint's deadline"""
+
+
+@dataclass
+class LLMPolicy:
+    """Deadline and hedging settings for one endpoint"""
+    deadline: float
+    hedge_after: float  # Used until enough latency samples exist to compute a p95
+    fallback_reserve: float  # Start the fallback model when this much time is left
+    fallback_model: str = DEFAULT_FALLBACK_MODEL
+
+    @classmethod
+    def from_env(cls, endpoint: str, deadline: float, hedge_after: float, fallback_reserve: float) -> "LLMPolicy":
+        """Read LLM_<ENDPOINT>_DEADLINE, _HEDGE_AFTER, _FALLBACK_RESERVE and LLM_FALLBACK_MODEL"""
+        prefix = f"LLM_{endpoint.upper()}"
+        return cls(
+            deadline=float(os.environ.get(f"{prefix}_DEADLINE", deadline)),
+            hedge_after=float(os.environ.get(f"{prefix}_HEDGE_AFTER", hedge_after)),
+            fallback_reserve=float(os.environ.get(f"{prefix}_FALLBACK_RESERVE", fallback_reserve)),
+            fallback_model=os.environ.get("LLM_FALLBACK_MODEL", DEFAULT_FALLBACK_MODEL),
+        )
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, 429s and 5xxs may succeed on another attempt; other errors will not"""
+    if isinstance(error, (anthropic.APIConnectionError, Overloaded)):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class HedgedLLM:
+    """Anthropic message calls with per-endpoint deadlines, hedging and a fallback model
+
+    The primary request starts immediately. If it has not answered by the endpoint's
+    p95 latency, an identical hedge request is sent. When the deadline is close, a
+    request to the faster fallback model is sent. The first successful response wins;
+    abandoned requests finish in the background, bounded by their own timeouts.
+    Errors another attempt cannot fix (400, 401, 413, ...) are raised immediately.
+    """
+
+    def __init__(self, client, policies: Dict[str, LLMPolicy], upstream: Optional[UpstreamLimiter] = None,
+                 max_workers: int = 16):
+        # Hedging replaces the SDK's own retries
+        self.client = client.with_options(max_retries=0)
+        self.policies = policies
+        self.upstream = upstream
+        self.latency = {endpoint: LatencyTracker() for endpoint in policies}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def _call(self, kind: str, timeout: float, kwargs: Dict[str, Any]):
+        if kind == "primary" or self.upstream is None:
+            return self.client.messages.create(timeout=timeout, **kwargs)
+        # Extra attempts never wait for upstream capacity; they are skipped if there is none
+        with self.upstream.slot(timeout=0):
+            return self.client.messages.create(timeout=timeout, **kwargs)
+
+    def create(self, endpoint: str, **kwargs):
+        """Drop-in for client.messages.create, governed by the endpoint's policy"""
+        policy = self.policies[endpoint]
+        tracker = self.latency[endpoint]
+        started = time.monotonic()
+        deadline_at = started + policy.deadline
+        fallback_at = deadline_at - policy.fallback_reserve
+        hedge_at = min(started + (tracker.p95() or policy.hedge_after), fallback_at)
+
+        stages = [(hedge_at, "hedge", kwargs["model"]), (fallback_at, "fallback", policy.fallback_model)]
+        pending = {}
+        last_error: Optional[Exception] = None
+
+        def launch(kind: str, model: str):
+            remaining = max(deadline_at - time.monotonic(), 0.1)
+            future = self.executor.submit(self._call, kind, remaining, {**kwargs, "model": model})
+            pending[future] = kind
+
+        launch("primary", kwargs["model"])
+        while True:
+            next_at = stages[0][0] if stages else deadline_at
+            timeout = max(min(next_at, deadline_at) - time.monotonic(), 0)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                kind = pending.pop(future)
+                try:
+                    message = future.result()
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    last_error = e
+                    continue
+                if kind != "fallback":
+                    tracker.record(time.monotonic() - started)
+                if kind != "primary":
+                    print(f"LLM {endpoint}: answered by {kind} request ({message.model})")
+                return message
+
+            if time.monotonic() >= deadline_at:
+                raise LLMDeadlineExceeded(f"{endpoint} did not respond within {policy.deadline}s")
+            # Move to the next stage on schedule, or straight away if every attempt so far failed retryably
+            if stages and (time.monotonic() >= stages[0][0] or not pending):
+                _, kind, model = stages.pop(0)
+                launch(kind, model)
+            elif not pending:
+                raise last_error
@@ -1,12 +1,13 @@
 import os
 import sys
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from anthropic import Anthropic
 import json
-import requests
-from supabase import create_client, Client
+from postgrest.exceptions import APIError
 from functools import wraps
+from werkzeug.local import LocalProxy
+from werkzeug.middleware.proxy_fix import ProxyFix
 import threading
 import asyncio
 import uuid
@@ -16,20 +17,71 @@ load_dotenv()
 
 # Import our topic news agent
 from topic_news_agent import fetch_topic_news
+from news_scheduler import NewsDigestScheduler, lookup_digests, combine_digests, normalize_topic
+from graph_transfer import export_graph, GraphImporter, GraphImportError
+from supabase_pool import SupabasePool, PoolTimeout
+from llm import HedgedLLM, LLMPolicy, LLMDeadlineExceeded
+from voice_sessions import VoiceSessionPool, VoiceSessionError, voice_instructions
+import serialization
+from profiling import Profiler, TaskTimer, require_admin
+from rate_limit import (
+    KeyedRateLimiter, UpstreamLimiter, Overloaded, rate_limited, uses_upstream, overloaded_response,
+    client_key, too_many_requests
+)
 
 app = Flask(__name__)
 CORS(app)
 
+# Behind reverse proxies, take the client address from the X-Forwarded-For entries they added
+TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", 0))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+# Fast JSON (orjson when installed), gzip/br responses and compressed request bodies
+serialization.init_app(app)
+
+# Opt-in sampling profiler for live requests and news jobs
+profiler = Profiler.from_env()
+profiler.init_app(app)
+
 # Initialize clients
 client = Anthropic(
     api_key=os.environ.get("ANTHROPIC_API_KEY")
 )
 
-# Initialize Supabase client
-supabase: Client = create_client(
-    os.environ.get("SUPABASE_URL"),
-    os.environ.get("SUPABASE_KEY")
-)
+# Pool of Supabase clients; `supabase` resolves to the client held by the current request
+# or by an enclosing `supabase_pool.connection()` block in background threads
+supabase_pool = SupabasePool.from_env()
+supabase_pool.init_app(app)
+supabase = LocalProxy(supabase_pool.current)
+
+# Precomputed news digests are served if they are younger than this
+NEWS_DIGEST_MAX_AGE_HOURS = float(os.environ.get("NEWS_DIGEST_MAX_AGE_HOURS", 24))
+
+# Rows read or written per Supabase call during graph export/import
+GRAPH_TRANSFER_BATCH_SIZE = int(os.environ.get("GRAPH_TRANSFER_BATCH_SIZE", 500))
+
+# Per-user request rates (429 when exceeded)
+subtopics_rate_limiter = KeyedRateLimiter.from_env('subtopics', per_minute=30)
+summarize_rate_limiter = KeyedRateLimiter.from_env('summarize', per_minute=10)
+news_rate_limiter = KeyedRateLimiter.from_env('news', per_minute=6, burst=3)
+session_rate_limiter = KeyedRateLimiter.from_env('session', per_minute=10)
+search_rate_limiter = KeyedRateLimiter.from_env('search', per_minute=60)
+prewarm_rate_limiter = KeyedRateLimiter.from_env('prewarm', per_minute=30)
+
+# Per-upstream concurrency, queue and call rate (503 when the queue is full)
+anthropic_upstream = UpstreamLimiter.from_env('anthropic', concurrency=8, max_queue=16, per_minute=50, default_latency=8)
+openai_upstream = UpstreamLimiter.from_env('openai', concurrency=4, max_queue=8, per_minute=60, default_latency=2)
+browser_upstream = UpstreamLimiter.from_env('browser', concurrency=1, max_queue=5, per_minute=30, default_latency=120)
+
+# Deadlines, hedging and fallback model for Claude calls made while a user waits
+llm = HedgedLLM(client, {
+    'subtopics': LLMPolicy.from_env('subtopics', deadline=12, hedge_after=6, fallback_reserve=4),
+    'summarize': LLMPolicy.from_env('summarize', deadline=30, hedge_after=15, fallback_reserve=10),
+}, upstream=anthropic_upstream)
+
+# Pre-minted realtime voice sessions, refilled in the background
+voice_sessions = VoiceSessionPool.from_env(upstream=openai_upstream)
 
 def verify_token(f):
     """Decorator to verify Supabase JWT token"""
@@ -49,44 +101,84 @@ def verify_token(f):
                 return f(*args, **kwargs)
             else:
                 return jsonify({'error': 'Invalid token'}), 401
+        except PoolTimeout:
+            # Answered with 503 and Retry-After by the pool's error handler
+            raise
         except Exception as e:
             print(f"Auth error: {e}")
             return jsonify({'error': 'Invalid token'}), 401
     
     return decorated
 
-def process_news_summary_background(summary_id: str, topics: list, user_id: str):
+# In-flight news jobs keyed by normalized topic set. Requests for the same topics attach
+# their summary row to the running job instead of starting another agent run.
+_inflight_news_jobs = {}
+_inflight_news_jobs_lock = threading.Lock()
+
+def news_topics_key(topics: list) -> str:
+    """Order-insensitive key for a set of topics"""
+    return '|'.join(sorted({normalize_topic(topic) for topic in topics}))
+
+# A finished job retries its final status update when the database pool is exhausted
+NEWS_JOB_SAVE_ATTEMPTS = 3
+
+def update_news_job(topics_key: str, fields: dict, summary_ids: list = None):
+    """Apply a status update to every summary row attached to an in-flight job"""
+    if summary_ids is None:
+        with _inflight_news_jobs_lock:
+            job = _inflight_news_jobs[topics_key]
+            job['status'] = fields.get('status', job['status'])
+            summary_ids = list(job['summary_ids'])
+    with supabase_pool.connection() as db:
+        db.table('news_summaries').update(fields).in_('id', summary_ids).execute()
+
+def process_news_summary_background(summary_id: str, topics: list, user_id: str, topics_key: str):
     """Background function to process news summary using MCP client"""
     async def async_process():
+        fields = None
         try:
             # Update status to processing
-            supabase.table('news_summaries').update({
-                'status': 'processing'
-            }).eq('id', summary_id).execute()
+            update_news_job(topics_key, {'status': 'processing'})
             
             # Fetch news using our MCP client
             result = await fetch_topic_news(topics)
             
             if 'error' in result:
                 # Update with error
-                supabase.table('news_summaries').update({
+                fields = {
                     'status': 'failed',
                     'error_message': result['error']
-                }).eq('id', summary_id).execute()
+                }
             else:
                 # Update with successful results
-                supabase.table('news_summaries').update({
+                fields = {
                     'status': 'completed',
                     'summary_markdown': result['summary_markdown'],
                     'raw_results': result['raw_results']
-                }).eq('id', summary_id).execute()
+                }
                 
         except Exception as e:
             # Update with error
-            supabase.table('news_summaries').update({
+            fields = {
                 'status': 'failed',
                 'error_message': str(e)
-            }).eq('id', summary_id).execute()
+            }
+        finally:
+            # Detach the job first so late requests start a fresh run rather than attach to a finished one
+            with _inflight_news_jobs_lock:
+                summary_ids = _inflight_news_jobs.pop(topics_key)['summary_ids']
+            # The final status must be written, or the rows stay pending until the next restart
+            attempt = 0
+            while fields:
+                attempt += 1
+                try:
+                    update_news_job(topics_key, fields, summary_ids)
+                    break
+                except PoolTimeout as e:
+                    print(f"Database pool busy saving news job {summary_id} (attempt {attempt}): {e}")
+                    if attempt >= NEWS_JOB_SAVE_ATTEMPTS:
+                        break
+                    await asyncio.sleep(e.retry_after)
     
     def run_async():
         # Create a new event loop for this thread
@@ -94,7 +186,15 @@ def process_news_summary_background(summary_id: str, topics: list, user_id: str)
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
-            loop.run_until_complete(async_process())
+            # Wait for the single dex MCP browser; the queue position was reserved when the job was admitted
+            with browser_upstream.slot(reject_when_full=False, reserved=True):
+                if profiler.take('jobs'):
+                    task_timer = TaskTimer()
+                    loop.set_task_factory(task_timer)
+                    with profiler.capture('job', f"news {summary_id}", task_timer):
+                        loop.run_until_complete(async_process())
+                else:
+                    loop.run_until_complete(async_process())
         finally:
             loop.close()
     
@@ -103,10 +203,48 @@ def process_news_summary_background(summary_id: str, topics: list, user_id: str)
     thread.daemon = True
     thread.start()
 
+def fail_orphaned_news_jobs():
+    """Mark summaries left pending/processing by a previous process as failed
+
+    Jobs run in daemon threads of this process, so at startup none of those rows can
+    still be in progress.
+    """
+    with supabase_pool.connection() as db:
+        response = db.table('news_summaries').update({
+            'status': 'failed',
+            'error_message': 'Interrupted by a server restart, please request the news again'
+        }).in_('status', ['pending', 'processing']).execute()
+    if response.data:
+        print(f"Marked {len(response.data)} interrupted news summaries as failed")
+
+def idempotent_replay(idempotency_key: str, topics_key: str):
+    """Response for a repeated Idempotency-Key, or None if the key has not been used yet"""
+    existing = supabase.table('news_summaries').select('id, status, topics_key').eq('user_id', request.user_id).eq('idempotency_key', idempotency_key).execute()
+    if not existing.data:
+        return None
+    summary = existing.data[0]
+    if summary['topics_key'] != topics_key:
+        return jsonify({'error': 'Idempotency-Key was already used for a different set of topics'}), 422
+    return news_job_response(summary, 'Existing news summary for this Idempotency-Key')
+
+def news_job_response(summary: dict, message: str):
+    return jsonify({
+        'summary_id': summary['id'],
+        'status': summary['status'],
+        'message': message
+    })
+
 @app.route('/api/topic-news', methods=['POST'])
 @verify_token
 def create_topic_news_summary():
-    """Create a new topic news summary (starts background processing)"""
+    """Create a new topic news summary (starts background processing)
+
+    Supports an Idempotency-Key header: repeating a request with the same key returns the
+    original summary (422 if the key was used for a different topic set). Requests for a
+    topic set whose job is still running in this process reuse that job instead of
+    starting a new agent run. Only requests that start a new agent run count against the
+    per-user news rate limit.
+    """
     try:
         data = request.get_json()
         topics = data.get('topics', [])
@@ -114,20 +252,111 @@ def create_topic_news_summary():
         if not topics or not isinstance(topics, list):
             return jsonify({'error': 'topics must be a non-empty array'}), 400
         
-        # Create initial database record
+        idempotency_key = request.headers.get('Idempotency-Key')
+        topics_key = news_topics_key(topics)
+
+        if idempotency_key:
+            replay = idempotent_replay(idempotency_key, topics_key)
+            if replay is not None:
+                return replay
+
+        # The same user already has a row attached to the running job for this topic set.
+        # Rows left pending by a restart or crash have no job here and never block a new request.
+        with _inflight_news_jobs_lock:
+            job = _inflight_news_jobs.get(topics_key)
+            inflight_ids = list(job['summary_ids']) if job else []
+        if inflight_ids:
+            existing = supabase.table('news_summaries').select('id, status').eq('user_id', request.user_id).in_('id', inflight_ids).in_('status', ['pending', 'processing']).order('created_at', desc=True).limit(1).execute()
+            if existing.data:
+                return news_job_response(existing.data[0], 'News summary for these topics is already in progress')
+
         summary_id = str(uuid.uuid4())
+
+        # Serve from precomputed digests when every topic has a fresh one
+        digests = lookup_digests(supabase, topics, NEWS_DIGEST_MAX_AGE_HOURS)
+        if digests:
+            supabase.table('news_summaries').insert({
+                'id': summary_id,
+                'user_id': request.user_id,
+                'topics': topics,
+                'topics_key': topics_key,
+                'idempotency_key': idempotency_key,
+                'status': 'completed',
+                **combine_digests(digests)
+            }).execute()
+            return jsonify({
+                'summary_id': summary_id,
+                'status': 'completed',
+                'message': 'News summary served from precomputed digests'
+            })
+        
+        with _inflight_news_jobs_lock:
+            job = _inflight_news_jobs.get(topics_key)
+            start_job = job is None
+            if start_job:
+                job = _inflight_news_jobs[topics_key] = {'summary_ids': [], 'status': 'pending'}
+            status = job['status']
+
+        # Only new agent runs need a browser queue position or rate limit tokens; replays and attaching are free
+        if start_job:
+            rejected = None
+            try:
+                browser_upstream.reserve()
+            except Overloaded as e:
+                rejected = overloaded_response(e)
+            else:
+                allowed, retry_after = news_rate_limiter.try_acquire(client_key())
+                if not allowed:
+                    browser_upstream.release_reservation()
+                    rejected = too_many_requests(retry_after)
+            if rejected is not None:
+                with _inflight_news_jobs_lock:
+                    _inflight_news_jobs.pop(topics_key, None)
+                return rejected
+
+        # Create initial database record
         initial_record = {
             'id': summary_id,
             'user_id': request.user_id,
             'topics': topics,
+            'topics_key': topics_key,
+            'idempotency_key': idempotency_key,
             'summary_markdown': '',  # Will be updated by background process
-            'status': 'pending'
+            'status': status
         }
         
-        supabase.table('news_summaries').insert(initial_record).execute()
+        try:
+            supabase.table('news_summaries').insert(initial_record).execute()
+        except APIError as e:
+            if start_job:
+                browser_upstream.release_reservation()
+                with _inflight_news_jobs_lock:
+                    _inflight_news_jobs.pop(topics_key, None)
+            # A concurrent request with the same Idempotency-Key won the insert
+            if e.code == '23505' and idempotency_key:
+                replay = idempotent_replay(idempotency_key, topics_key)
+                if replay is not None:
+                    return replay
+            raise
+
+        with _inflight_news_jobs_lock:
+            current = _inflight_news_jobs.get(topics_key)
+            if current is None:
+                # The job we were going to attach to finished while the row was being inserted
+                current = _inflight_news_jobs[topics_key] = {'summary_ids': [], 'status': 'pending'}
+                start_job = True
+                browser_upstream.reserve(reject_when_full=False)
+            current['summary_ids'].append(summary_id)
+
+        if not start_job:
+            return jsonify({
+                'summary_id': summary_id,
+                'status': status,
+                'message': 'Attached to an in-flight news job for the same topics. Check status using GET /api/topic-news/{summary_id}'
+            })
         
         # Start background processing
-        process_news_summary_background(summary_id, topics, request.user_id)
+        process_news_summary_background(summary_id, topics, request.user_id, topics_key)
         
         return jsonify({
             'summary_id': summary_id,
@@ -165,7 +394,40 @@ def list_topic_news_summaries():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/search', methods=['GET'])
+@verify_token
+@rate_limited(search_rate_limiter)
+def search_user_content():
+    """Full-text search over the user's topic notes and news summaries"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'q is required'}), 400
+
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 50)
+
+        response = supabase.rpc('search_user_content', {
+            'p_user_id': request.user_id,
+            'p_query': query,
+            'p_limit': per_page,
+            'p_offset': (page - 1) * per_page
+        }).execute()
+        rows = response.data or []
+
+        return jsonify({
+            'results': [{key: row[key] for key in ('kind', 'id', 'title', 'snippet', 'rank', 'created_at')} for row in rows],
+            'total': rows[0]['total_count'] if rows else 0,
+            'page': page,
+            'per_page': per_page
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/generate-subtopics', methods=['POST'])
+@rate_limited(subtopics_rate_limiter)
+@uses_upstream(anthropic_upstream)
 def generate_subtopics():
     """Generate subtopics for a given parent topic"""
     try:
@@ -175,7 +437,8 @@ def generate_subtopics():
         if not parent_topic:
             return jsonify({'error': 'parent_topic is required'}), 400
         
-        message = client.messages.create(
+        message = llm.create(
+            'subtopics',
             model="claude-sonnet-4-20250514",
             max_tokens=1000,
             messages=[{
@@ -201,10 +464,17 @@ Only return the JSON array, no other text."""
         
     except json.JSONDecodeError:
         return jsonify({'error': 'Failed to parse AI response'}), 500
+    except LLMDeadlineExceeded as e:
+        return jsonify({'error': str(e)}), 504
+    except Overloaded as e:
+        # Every hedged attempt was turned away by the upstream limiter
+        return overloaded_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/summarize-conversation', methods=['POST'])
+@rate_limited(summarize_rate_limiter)
+@uses_upstream(anthropic_upstream)
 def summarize_conversation():
     """Summarize a conversation transcript and suggest new subtopics"""
     try:
@@ -215,7 +485,8 @@ def summarize_conversation():
         if not transcript or not parent_topic:
             return jsonify({'error': 'Both transcript and parent_topic are required'}), 400
         
-        message = client.messages.create(
+        message = llm.create(
+            'summarize',
             model="claude-sonnet-4-20250514",
             max_tokens=1500,
             messages=[{
@@ -257,55 +528,83 @@ Only return the JSON, no other text."""
         
     except json.JSONDecodeError:
         return jsonify({'error': 'Failed to parse AI response'}), 500
+    except LLMDeadlineExceeded as e:
+        return jsonify({'error': str(e)}), 504
+    except Overloaded as e:
+        # Every hedged attempt was turned away by the upstream limiter
+        return overloaded_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/session', methods=['POST'])
+@rate_limited(session_rate_limiter)
 def create_voice_session():
-    """Create OpenAI realtime session for voice conversation"""
+    """Create OpenAI realtime session for voice conversation
+
+    Served from the pre-minted session pool when possible; only a pool miss calls OpenAI
+    and takes an upstream slot. A generic pooled session comes with `session_update`,
+    which the client sends over the data channel to set the topic.
+    """
     try:
         data = request.get_json()
         topic = data.get('topic', 'general learning')
         
-        response = requests.post(
-            "https://api.openai.com/v1/realtime/sessions",
-            headers={
-                "Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY')}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "gpt-4o-realtime-preview-2024-12-17",
-                "voice": "alloy",
-                "instructions": f"""You are an engaging educational assistant teaching about {topic}. 
-
-Your role:
-- Start by giving an interesting 30-60 second overview of {topic}
-- Speak in a conversational, podcast-like manner
-- Speak quickly, like the podcast is at 2x speed
-- Allow the user to interrupt with questions at any time
-- Keep responses engaging but not too long (30-60 seconds each)
-- If the user asks to explore a specific aspect, dive deeper into that area
-- Encourage curiosity and questions
-
-Remember: This is an interactive learning conversation, not a lecture. Be enthusiastic about the topic and make it accessible."""
-            }
-        )
-        
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({'error': 'Failed to create session', 'details': response.text}), response.status_code
+        session, needs_update = voice_sessions.get(topic)
+        if needs_update:
+            session = {**session, 'session_update': {'instructions': voice_instructions(topic)}}
+        return jsonify(session)
         
+    except VoiceSessionError as e:
+        return jsonify({'error': 'Failed to create session', 'details': e.details}), e.status_code
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/session/prewarm', methods=['POST'])
+@verify_token
+@rate_limited(prewarm_rate_limiter)
+def prewarm_voice_session():
+    """Mint a session for a topic in the background, ahead of a likely /api/session call"""
+    data = request.get_json() or {}
+    topic = data.get('topic')
+    if not topic:
+        return jsonify({'error': 'topic is required'}), 400
+    voice_sessions.prewarm(topic)
+    return jsonify({'status': 'accepted'}), 202
+
+# Graph columns returned by GET /api/user/topics; note bodies live in topic_notes
+TOPIC_COLUMNS = 'id, user_id, name, color, size, position_x, position_y, expanded, created_at, updated_at'
+# Ids per `in` filter, keeping request URLs short
+ID_CHUNK_SIZE = 100
+
+def fetch_notes(topic_ids: list) -> dict:
+    """Map topic id -> topic_notes row for the given topics"""
+    notes = {}
+    for start in range(0, len(topic_ids), ID_CHUNK_SIZE):
+        chunk = topic_ids[start:start + ID_CHUNK_SIZE]
+        response = supabase.table('topic_notes').select('topic_id, body, version').eq('user_id', request.user_id).in_('topic_id', chunk).execute()
+        for row in response.data:
+            notes[row['topic_id']] = row
+    return notes
+
 @app.route('/api/user/topics', methods=['GET'])
 @verify_token
 def get_user_topics():
-    """Get all topics for the authenticated user"""
+    """Get all topics for the authenticated user
+
+    Note bodies are left out unless requested with ?include=notes.
+    """
     try:
-        response = supabase.table('topics').select('*').eq('user_id', request.user_id).execute()
+        response = supabase.table('topics').select(TOPIC_COLUMNS).eq('user_id', request.user_id).execute()
         topics = response.data
+
+        if request.args.get('include') == 'notes':
+            notes = fetch_notes([topic['id'] for topic in topics])
+            for topic in topics:
+                note = notes.get(topic['id'])
+                topic['notes'] = note['body'] if note else ''
+                topic['notes_version'] = note['version'] if note else 0
         
         # Get relationships
         relationships_response = supabase.table('topic_relationships').select('*').eq('user_id', request.user_id).execute()
@@ -321,13 +620,16 @@ def get_user_topics():
 @app.route('/api/user/topics', methods=['POST'])
 @verify_token
 def save_user_topics():
-    """Save topics and relationships for the authenticated user"""
+    """Save topics and relationships for the authenticated user
+
+    Notes are not part of the graph payload; use PATCH /api/user/topics/<id>/notes.
+    """
     try:
         data = request.get_json()
         topics = data.get('topics', [])
         relationships = data.get('relationships', [])
         
-        # Use upsert instead of delete/insert to handle updates better
+        # Upsert rather than delete/insert so topic_notes rows (which cascade on delete) survive
         topics_to_upsert = []
         for topic in topics:
             topics_to_upsert.append({
@@ -336,15 +638,28 @@ def save_user_topics():
                 'name': topic['name'],
                 'color': topic['color'],
                 'size': topic['size'],
-                'expanded': topic.get('expanded', False),
-                'notes': topic.get('notes', '')
+                'expanded': topic.get('expanded', False)
             })
         
         if topics_to_upsert:
-            # Clear existing topics first
-            supabase.table('topics').delete().eq('user_id', request.user_id).execute()
-            # Insert new topics
-            supabase.table('topics').insert(topics_to_upsert).execute()
+            # Upserting by id must never take over another user's topic
+            ids = [topic['id'] for topic in topics_to_upsert]
+            for start in range(0, len(ids), ID_CHUNK_SIZE):
+                foreign = supabase.table('topics').select('id').in_('id', ids[start:start + ID_CHUNK_SIZE]).neq('user_id', request.user_id).execute()
+                if foreign.data:
+                    return jsonify({'error': 'Topic id already in use'}), 409
+
+            supabase.table('topics').upsert(topics_to_upsert, on_conflict='id').execute()
+
+            # Remove topics that are no longer in the graph
+            saved_ids = {topic['id'] for topic in topics_to_upsert}
+            existing = supabase.table('topics').select('id').eq('user_id', request.user_id).execute()
+            removed_ids = [row['id'] for row in existing.data if row['id'] not in saved_ids]
+            for start in range(0, len(removed_ids), ID_CHUNK_SIZE):
+                supabase.table('topics').delete().eq('user_id', request.user_id).in_('id', removed_ids[start:start + ID_CHUNK_SIZE]).execute()
+
+            # Clear existing relationships first
+            supabase.table('topic_relationships').delete().eq('user_id', request.user_id).execute()
         
         # Handle relationships
         relationships_to_insert = []
@@ -356,8 +671,6 @@ def save_user_topics():
             })
         
         if relationships_to_insert:
-            # Clear existing relationships first
-            supabase.table('topic_relationships').delete().eq('user_id', request.user_id).execute()
             # Insert new relationships
             supabase.table('topic_relationships').insert(relationships_to_insert).execute()
         
@@ -368,10 +681,142 @@ def save_user_topics():
         print(f"Relationships data: {relationships}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/user/topics/<topic_id>/notes', methods=['GET'])
+@verify_token
+def get_topic_notes(topic_id):
+    """Get the notes for one topic (version 0 means no notes have been saved yet)"""
+    try:
+        response = supabase.table('topic_notes').select('body, version').eq('topic_id', topic_id).eq('user_id', request.user_id).execute()
+        note = response.data[0] if response.data else {'body': '', 'version': 0}
+        return jsonify({'topic_id': topic_id, 'notes': note['body'], 'version': note['version']})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/user/topics/<topic_id>/notes', methods=['PATCH'])
+@verify_token
+def update_topic_notes(topic_id):
+    """Replace one topic's notes, if `version` still matches the stored version
+
+    Returns 409 with the current notes and version when someone else saved first.
+    """
+    try:
+        data = request.get_json()
+        notes = data.get('notes')
+        version = data.get('version')
+
+        if not isinstance(notes, str) or not isinstance(version, int):
+            return jsonify({'error': 'notes (string) and version (integer) are required'}), 400
+
+        topic = supabase.table('topics').select('id').eq('id', topic_id).eq('user_id', request.user_id).execute()
+        if not topic.data:
+            return jsonify({'error': 'Topic not found'}), 404
+
+        try:
+            if version == 0:
+                response = supabase.table('topic_notes').insert({
+                    'topic_id': topic_id,
+                    'user_id': request.user_id,
+                    'body': notes,
+                    'version': 1
+                }).execute()
+            else:
+                response = supabase.table('topic_notes').update({
+                    'body': notes,
+                    'version': version + 1
+                }).eq('topic_id', topic_id).eq('user_id', request.user_id).eq('version', version).execute()
+        except APIError as e:
+            # Another writer created the notes row first
+            if e.code != '23505':
+                raise
+            response = None
+
+        if not response or not response.data:
+            current = supabase.table('topic_notes').select('body, version').eq('topic_id', topic_id).eq('user_id', request.user_id).execute()
+            note = current.data[0] if current.data else {'body': '', 'version': 0}
+            return jsonify({
+                'error': 'Notes were changed since they were loaded',
+                'notes': note['body'],
+                'version': note['version']
+            }), 409
+
+        return jsonify({'topic_id': topic_id, 'notes': notes, 'version': response.data[0]['version']})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/user/topics/export', methods=['GET'])
+@verify_token
+def export_user_topics():
+    """Stream the user's graph (topics with notes and positions, then relationships) as NDJSON"""
+    # The export borrows a client per batch; don't hold this request's client for the whole download
+    supabase_pool.release()
+    lines = export_graph(supabase_pool.connection, request.user_id, GRAPH_TRANSFER_BATCH_SIZE)
+    return Response(
+        stream_with_context(lines),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename="learnloop-graph.ndjson"'}
+    )
+
+@app.route('/api/user/topics/import', methods=['POST'])
+@verify_token
+def import_user_topics():
+    """Import an NDJSON graph export, writing in bounded batches as the body streams in
+
+    Pass ?replace=true to replace the user's graph: the import is written under new topic
+    ids and the old graph is deleted only once the whole stream has been written (see
+    GraphImporter; this is not atomic). Otherwise topics are upserted by id and merged
+    into the current graph; a merge import is not rolled back, so if it fails after its
+    first batch the batches already written stay in the graph.
+    """
+    try:
+        importer = GraphImporter(supabase, request.user_id, GRAPH_TRANSFER_BATCH_SIZE,
+                                 replace=request.args.get('replace') == 'true')
+        counts = importer.run(request.stream)
+        return jsonify({'success': True, 'imported': counts})
+    except GraphImportError as e:
+        return jsonify({'error': str(e), 'imported': importer.counts}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/profile', methods=['POST'])
+@require_admin(profiler)
+def arm_profiler():
+    """Profile the next N requests and/or news jobs"""
+    data = request.get_json() or {}
+    remaining = profiler.arm(requests=int(data.get('requests', 0)), jobs=int(data.get('jobs', 0)))
+    return jsonify({'remaining': remaining})
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@require_admin(profiler)
+def list_profiles():
+    """List captured profile dumps"""
+    return jsonify({'profiles': profiler.list_dumps(), 'remaining': profiler.remaining})
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+@require_admin(profiler)
+def download_profile(name):
+    """Download a profile dump"""
+    return send_from_directory(profiler.profile_dir, name, as_attachment=True)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy'})
+    return jsonify({
+        'status': 'healthy',
+        'upstreams': {
+            limiter.name: limiter.stats()
+            for limiter in (anthropic_upstream, openai_upstream, browser_upstream)
+        },
+        'supabase_pool': supabase_pool.stats(),
+        'voice_sessions': voice_sessions.stats()
+    })
 
 if __name__ == "__main__":
+    # Only run startup work once, in the reloader's child process
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        try:
+            fail_orphaned_news_jobs()
+        except Exception as e:
+            print(f"Failed to clean up interrupted news jobs: {e}")
+        if os.environ.get("NEWS_PRECOMPUTE_ENABLED") == "true":
+            NewsDigestScheduler.from_env(supabase_pool, browser_upstream).start()
     app.run(debug=True, port=5001)
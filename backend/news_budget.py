@@ -0,0 +1,193 @@
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, asdict, replace
+from typing import Any, Dict, List, Optional
+
+from agents import Agent, RunContextWrapper, RunHooks, Tool
+from agents.exceptions import AgentsException
+
+
+@dataclass
+class NewsBudget:
+    """Limits applied to a single news research job"""
+    max_total_tokens: int = 200_000
+    max_tool_calls: int = 40
+    max_turns: int = 20
+    max_seconds: float = 180.0
+    per_topic_tokens: int = 60_000
+    per_topic_tool_calls: int = 12
+    summary_seconds: float = 45.0
+    summary_context_chars: int = 24_000
+
+    @classmethod
+    def from_env(cls) -> "NewsBudget":
+        """Build a budget from NEWS_BUDGET_* environment variables"""
+        defaults = cls()
+        return cls(
+            max_total_tokens=int(os.environ.get("NEWS_BUDGET_MAX_TOKENS", defaults.max_total_tokens)),
+            max_tool_calls=int(os.environ.get("NEWS_BUDGET_MAX_TOOL_CALLS", defaults.max_tool_calls)),
+            max_turns=int(os.environ.get("NEWS_BUDGET_MAX_TURNS", defaults.max_turns)),
+            max_seconds=float(os.environ.get("NEWS_BUDGET_MAX_SECONDS", defaults.max_seconds)),
+            per_topic_tokens=int(os.environ.get("NEWS_BUDGET_PER_TOPIC_TOKENS", defaults.per_topic_tokens)),
+            per_topic_tool_calls=int(os.environ.get("NEWS_BUDGET_PER_TOPIC_TOOL_CALLS", defaults.per_topic_tool_calls)),
+            summary_seconds=float(os.environ.get("NEWS_BUDGET_SUMMARY_SECONDS", defaults.summary_seconds)),
+            summary_context_chars=int(os.environ.get("NEWS_BUDGET_SUMMARY_CONTEXT_CHARS", defaults.summary_context_chars)),
+        )
+
+    def for_topics(self, topic_count: int) -> "NewsBudget":
+        """Cap the job's token and tool call limits at the per-topic caps times the topic count"""
+        topic_count = max(topic_count, 1)
+        return replace(
+            self,
+            max_total_tokens=min(self.max_total_tokens, self.per_topic_tokens * topic_count),
+            max_tool_calls=min(self.max_tool_calls, self.per_topic_tool_calls * topic_count),
+        )
+
+
+class BudgetExceeded(AgentsException):
+    """Raised from the run hooks when a job has used up one of its budgets"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(f"News research budget exhausted: {reason}")
+
+
+class BudgetTracker(RunHooks):
+    """Run hooks that meter an agent run and stop it once a budget is spent
+
+    Budgets are enforced by `before_tool_call`, which the MCP server runs before each
+    browser action: the SDK starts `on_tool_start` alongside the tool itself, so raising
+    there would not stop the call. Tool calls and the tokens spent choosing them are
+    attributed to the topic named in the tool arguments (or the last topic named), and
+    a topic over its per-topic caps gets no further browser calls.
+    """
+
+    def __init__(self, budget: NewsBudget, topics: Optional[List[str]] = None):
+        self.budget = budget
+        self.topics = sorted(topics or [], key=len, reverse=True)
+        self.topic_usage: Dict[str, Dict[str, int]] = {topic: {"tokens": 0, "tool_calls": 0} for topic in self.topics}
+        self.current_topic: Optional[str] = None
+        self.attributed_tokens = 0
+        self.context: Optional[RunContextWrapper[Any]] = None
+        self.started_at = time.monotonic()
+        self.tool_calls = 0
+        self.total_tokens = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.requests = 0
+        self.exhausted: Optional[str] = None
+        self.findings: List[Dict[str, str]] = []
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining_seconds(self) -> float:
+        return max(self.budget.max_seconds - self.elapsed(), 0.0)
+
+    def record_usage(self, context: RunContextWrapper[Any]) -> None:
+        usage = context.usage
+        self.requests = usage.requests
+        self.input_tokens = usage.input_tokens
+        self.output_tokens = usage.output_tokens
+        self.total_tokens = usage.total_tokens
+
+    def add_usage(self, usage: Any) -> None:
+        """Add usage from a follow-up run (e.g. the forced summary)"""
+        self.requests += usage.requests
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+        self.total_tokens += usage.total_tokens
+
+    def mark_exhausted(self, reason: str) -> None:
+        if not self.exhausted:
+            self.exhausted = reason
+
+    def check(self) -> None:
+        """Raise BudgetExceeded if any budget has been used up"""
+        if self.total_tokens >= self.budget.max_total_tokens:
+            self.mark_exhausted("tokens")
+        elif self.tool_calls >= self.budget.max_tool_calls:
+            self.mark_exhausted("tool_calls")
+        elif self.elapsed() >= self.budget.max_seconds:
+            self.mark_exhausted("wall_clock")
+
+        if self.exhausted:
+            raise BudgetExceeded(self.exhausted)
+
+    def topic_for(self, arguments: Optional[Dict[str, Any]]) -> Optional[str]:
+        """The topic a tool call works on, falling back to the last topic named"""
+        text = json.dumps(arguments or {}).lower()
+        for topic in self.topics:
+            if re.search(rf"\b{re.escape(topic.lower())}\b", text):
+                return topic
+        return self.current_topic
+
+    def before_tool_call(self, tool_name: str, arguments: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Check the budgets before a browser action
+
+        Raises BudgetExceeded when the job is out of budget. Returns a message for the
+        agent instead of running the tool when only the call's topic is out of budget.
+        """
+        if self.context is not None:
+            self.record_usage(self.context)
+        self.check()
+
+        topic = self.topic_for(arguments)
+        if topic is not None:
+            self.current_topic = topic
+            usage = self.topic_usage[topic]
+            usage["tokens"] += self.total_tokens - self.attributed_tokens
+            self.attributed_tokens = self.total_tokens
+            if usage["tokens"] >= self.budget.per_topic_tokens or usage["tool_calls"] >= self.budget.per_topic_tool_calls:
+                return (f"The research budget for '{topic}' is used up; {tool_name} was not run. "
+                        "Move on to the remaining topics, or write the summary from what you have.")
+            usage["tool_calls"] += 1
+
+        self.tool_calls += 1
+        return None
+
+    async def on_agent_start(self, context: RunContextWrapper[Any], agent: Agent[Any]) -> None:
+        # The runner keeps updating this wrapper's usage, so before_tool_call can read it later
+        self.context = context
+
+    async def on_tool_start(self, context: RunContextWrapper[Any], agent: Agent[Any], tool: Tool) -> None:
+        self.record_usage(context)
+
+    async def on_tool_end(self, context: RunContextWrapper[Any], agent: Agent[Any], tool: Tool, result: str) -> None:
+        self.findings.append({"tool": tool.name, "result": str(result)})
+
+    async def on_agent_end(self, context: RunContextWrapper[Any], agent: Agent[Any], output: Any) -> None:
+        self.record_usage(context)
+
+    def findings_digest(self) -> str:
+        """Collected tool output, newest last, trimmed to the summary context size"""
+        limit = self.budget.summary_context_chars
+        parts: List[str] = []
+        used = 0
+        for finding in reversed(self.findings):
+            block = f"[{finding['tool']}]\n{finding['result']}"
+            if used + len(block) > limit:
+                block = block[:max(limit - used, 0)]
+            if not block:
+                break
+            parts.append(block)
+            used += len(block)
+        return "\n\n".join(reversed(parts))
+
+    def report(self) -> Dict[str, Any]:
+        """Budget consumption for raw_results"""
+        return {
+            "limits": asdict(self.budget),
+            "used": {
+                "total_tokens": self.total_tokens,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "requests": self.requests,
+                "tool_calls": self.tool_calls,
+                "seconds": round(self.elapsed(), 2),
+            },
+            "per_topic": self.topic_usage,
+            "exhausted": self.exhausted,
+        }
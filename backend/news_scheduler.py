@@ -0,0 +1,173 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from rate_limit import UpstreamLimiter
+from topic_news_agent import fetch_topic_news
+
+
+def normalize_topic(name: str) -> str:
+    """Normalize a topic name so the same topic is only researched once across users"""
+    return " ".join(name.split()).lower()
+
+
+def parse_hours(spec: str) -> set:
+    """Parse an hour window like "1-6" or "22-3,13" into a set of UTC hours"""
+    hours = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = (int(h) % 24 for h in part.split("-", 1))
+            hour = start
+            while True:
+                hours.add(hour)
+                if hour == end:
+                    break
+                hour = (hour + 1) % 24
+        else:
+            hours.add(int(part) % 24)
+    return hours
+
+
+def lookup_digests(supabase, topics: List[str], max_age_hours: float) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Return fresh precomputed digests for every topic, or None if any topic is missing or stale"""
+    keys = {normalize_topic(topic): topic for topic in topics}
+    response = supabase.table('news_digests').select('*').in_('topic_key', list(keys)).execute()
+
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+    digests = {}
+    for row in response.data:
+        if datetime.fromisoformat(row['refreshed_at']) >= cutoff:
+            digests[row['topic_key']] = row
+
+    if set(digests) != set(keys):
+        return None
+    return {keys[key]: digest for key, digest in digests.items()}
+
+
+def combine_digests(digests: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Build a news summary record body from per-topic digests"""
+    sections = [f"## {topic}\n\n{digest['summary_markdown']}" for topic, digest in digests.items()]
+    return {
+        'summary_markdown': "\n\n".join(sections),
+        'raw_results': {
+            'source': 'precomputed',
+            'digests': {
+                topic: {'topic_key': digest['topic_key'], 'refreshed_at': digest['refreshed_at']}
+                for topic, digest in digests.items()
+            },
+        },
+    }
+
+
+class NewsDigestScheduler:
+    """Periodically precomputes news digests for every distinct topic in users' graphs"""
+
+    def __init__(self, supabase_pool, interval_seconds: float = 900, batch_size: int = 20, concurrency: int = 1,
+                 off_peak_hours: str = "1-6", max_age_hours: float = 24,
+                 browser_upstream: Optional[UpstreamLimiter] = None):
+        self.supabase_pool = supabase_pool
+        # Shared with interactive news jobs, so precomputation queues behind them for the browser
+        self.browser_upstream = browser_upstream
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.off_peak_hours = parse_hours(off_peak_hours)
+        self.max_age_hours = max_age_hours
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls, supabase_pool, browser_upstream: Optional[UpstreamLimiter] = None) -> "NewsDigestScheduler":
+        """Build a scheduler from NEWS_PRECOMPUTE_* environment variables"""
+        return cls(
+            supabase_pool,
+            browser_upstream=browser_upstream,
+            interval_seconds=float(os.environ.get("NEWS_PRECOMPUTE_INTERVAL_SECONDS", 900)),
+            batch_size=int(os.environ.get("NEWS_PRECOMPUTE_BATCH_SIZE", 20)),
+            # Concurrent agents would drive the same local browser; keep to one per browser instance
+            concurrency=int(os.environ.get("NEWS_PRECOMPUTE_CONCURRENCY", 1)),
+            off_peak_hours=os.environ.get("NEWS_PRECOMPUTE_HOURS", "1-6"),
+            max_age_hours=float(os.environ.get("NEWS_DIGEST_MAX_AGE_HOURS", 24)),
+        )
+
+    def start(self):
+        """Start the scheduler loop in a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="news-digest-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if datetime.now(timezone.utc).hour in self.off_peak_hours:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"News digest scheduler error: {e}")
+            self._stop.wait(self.interval_seconds)
+
+    def stale_topics(self) -> Dict[str, str]:
+        """Up to batch_size distinct topics with no digest, or one older than half the max age
+
+        Distinct names and the digest comparison are computed in the database, so this
+        does not download every user's topics or every digest.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.max_age_hours / 2)
+        with self.supabase_pool.connection() as supabase:
+            response = supabase.rpc('stale_news_topics', {
+                'p_fresh_after': cutoff.isoformat(),
+                'p_limit': self.batch_size,
+            }).execute()
+        return {row['topic_key']: row['topic'] for row in response.data or []}
+
+    def run_once(self) -> int:
+        """Research one batch of stale topics; returns the number of digests refreshed"""
+        batch = list(self.stale_topics().items())
+        if not batch:
+            return 0
+        print(f"Precomputing news digests for {len(batch)} topics")
+        return asyncio.run(self._research_batch(batch))
+
+    async def _research_batch(self, batch: List[tuple]) -> int:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def research(topic_key: str, topic: str) -> bool:
+            async with semaphore:
+                if self._stop.is_set():
+                    return False
+                started = time.monotonic()
+                result = await self._research(topic)
+                if 'error' in result:
+                    print(f"Digest for '{topic}' failed: {result['error']}")
+                    return False
+                await asyncio.to_thread(self._store_digest, topic_key, topic, result, time.monotonic() - started)
+                return True
+
+        results = await asyncio.gather(*(research(key, topic) for key, topic in batch))
+        return sum(results)
+
+    async def _research(self, topic: str) -> Dict[str, Any]:
+        if self.browser_upstream is None:
+            return await fetch_topic_news([topic])
+        async with self.browser_upstream.async_slot(reject_when_full=False):
+            return await fetch_topic_news([topic])
+
+    def _store_digest(self, topic_key: str, topic: str, result: Dict[str, Any], seconds: float):
+        with self.supabase_pool.connection() as supabase:
+            supabase.table('news_digests').upsert({
+                'topic_key': topic_key,
+                'topic': topic,
+                'summary_markdown': result['summary_markdown'],
+                'raw_results': {**result['raw_results'], 'research_seconds': round(seconds, 2)},
+                'refreshed_at': datetime.now(timezone.utc).isoformat(),
+            }, on_conflict='topic_key').execute()
@@ -0,0 +1,238 @@
+import hashlib
+import os
+import re
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from agents.mcp import MCPServerSse
+from mcp.types import CallToolResult, TextContent
+
+# Tools whose output is page content and should be reduced before it reaches the model.
+# grab_dom is left alone: the agent uses it to find forms, buttons and links to act on.
+REDUCED_TOOLS = {"get_page_content", "search_google"}
+
+# Elements that never carry article content
+SKIPPED_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "nav", "header", "footer", "aside", "form", "button", "select", "head",
+}
+MAIN_TAGS = {"main", "article"}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "br", "li", "ul", "ol", "tr", "table",
+    "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "figcaption", "dd", "dt",
+}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+BOILERPLATE_PATTERNS = re.compile(
+    r"^(accept( all)? cookies?|we use cookies.*|cookie (settings|policy)|sign in|log in|sign up|subscribe( now)?|"
+    r"skip to (main )?content|share( this)?( on \w+)?|advertisement|all rights reserved.*|privacy policy|terms of (use|service)|"
+    r"menu|close|back to top|read more|loading\.*)$",
+    re.IGNORECASE,
+)
+HTML_HINT = re.compile(r"<\s*(html|body|div|p|a|span|section|article|main|script)\b", re.IGNORECASE)
+CHARS_PER_TOKEN = 4
+
+
+def link_target(href: Optional[str]) -> Optional[str]:
+    """The absolute http(s) URL an <a href> points to, unwrapping search engine redirects"""
+    if not href:
+        return None
+    parsed = urlparse(href.strip())
+    # Google result links look like /url?q=<target>&sa=...
+    if parsed.path == "/url":
+        query = parse_qs(parsed.query)
+        target = (query.get("q") or query.get("url") or [None])[0]
+        if target:
+            parsed = urlparse(target)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return None
+    return parsed.geturl()
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text, keeping <main>/<article> content separately
+
+    Link targets are kept inline as `text (url)` so the agent can cite and visit them.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.main_depth = 0
+        self.all_text: List[str] = []
+        self.main_text: List[str] = []
+        self.link: Optional[Dict[str, Any]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag == "br":
+                self._emit("\n")
+            return
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag in MAIN_TAGS:
+            self.main_depth += 1
+        if tag == "a":
+            url = link_target(dict(attrs).get("href"))
+            self.link = {"url": url, "text": []} if url else None
+        if tag in BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        if tag == "a" and self.link is not None:
+            self._emit_link()
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag in MAIN_TAGS:
+            self.main_depth = max(self.main_depth - 1, 0)
+        if tag in BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_data(self, data):
+        self._emit(data)
+
+    def _emit(self, text: str):
+        if self.skip_depth:
+            return
+        self.all_text.append(text)
+        if self.main_depth:
+            self.main_text.append(text)
+        if self.link is not None:
+            self.link["text"].append(text)
+
+    def _emit_link(self):
+        url = self.link["url"]
+        text = "".join(self.link["text"])
+        self.link = None
+        if self.skip_depth or not text.strip() or url in text:
+            return
+        # Attach the URL to the anchor's last line of text, even if block tags inside it added newlines
+        for chunks in ([self.all_text, self.main_text] if self.main_depth else [self.all_text]):
+            end = len(chunks)
+            while end and not chunks[end - 1].strip():
+                end -= 1
+            chunks.insert(end, f" ({url})")
+
+
+def extract_main_content(html: str) -> str:
+    """Strip scripts, navigation and chrome from an HTML page, preferring <main>/<article> content"""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        # Malformed markup: fall back to a crude tag strip
+        return re.sub(r"<[^>]+>", " ", html)
+
+    main_text = "".join(parser.main_text)
+    all_text = "".join(parser.all_text)
+    # Only trust <main>/<article> when it holds a meaningful share of the page
+    if len(main_text.strip()) > 200:
+        return main_text
+    return all_text
+
+
+def clean_text(text: str) -> str:
+    """Collapse whitespace and drop boilerplate and repeated lines
+
+    Lines carrying a link never match the boilerplate patterns, and are only dropped as
+    repeats when both the text and the URL repeat.
+    """
+    lines = []
+    seen = set()
+    for line in text.splitlines():
+        line = re.sub(r"\s+", " ", line).strip()
+        if not line or BOILERPLATE_PATTERNS.match(line):
+            continue
+        key = line.lower()
+        # Repeated short lines are menus, breadcrumbs and share widgets
+        if key in seen and len(line) < 200:
+            continue
+        seen.add(key)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to an approximate token budget on a line boundary"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    if cut < max_chars // 2:
+        cut = max_chars
+    return text[:cut] + f"\n[... truncated {len(text) - cut} characters to fit the page token budget]"
+
+
+class PageReducer:
+    """Reduces page content returned by browser tools and remembers pages seen during a job"""
+
+    def __init__(self, max_tokens_per_page: Optional[int] = None):
+        self.max_tokens_per_page = max_tokens_per_page or int(os.environ.get("NEWS_PAGE_MAX_TOKENS", 3000))
+        self.seen_pages: Dict[str, str] = {}
+        self.calls = 0
+        self.duplicates = 0
+        self.raw_chars = 0
+        self.reduced_chars = 0
+
+    def reduce(self, tool_name: str, text: str) -> str:
+        self.calls += 1
+        self.raw_chars += len(text)
+
+        if HTML_HINT.search(text):
+            text = extract_main_content(text)
+        text = clean_text(text)
+
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if digest in self.seen_pages:
+            self.duplicates += 1
+            reduced = f"[Same content as an earlier {self.seen_pages[digest]} result in this job; omitted]"
+        else:
+            self.seen_pages[digest] = tool_name
+            reduced = truncate_to_tokens(text, self.max_tokens_per_page)
+
+        self.reduced_chars += len(reduced)
+        return reduced
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "duplicates": self.duplicates,
+            "raw_chars": self.raw_chars,
+            "reduced_chars": self.reduced_chars,
+            "max_tokens_per_page": self.max_tokens_per_page,
+        }
+
+
+class ReducingMCPServerSse(MCPServerSse):
+    """MCPServerSse that passes page content through a PageReducer before the agent sees it
+
+    `before_call(tool_name, arguments)` runs before every tool call. It may raise to stop
+    the run, or return a message that the agent receives instead of the tool's output.
+    """
+
+    def __init__(self, *args, reducer: Optional[PageReducer] = None,
+                 before_call: Optional[Callable[[str, Optional[Dict[str, Any]]], Optional[str]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reducer = reducer or PageReducer()
+        self.before_call = before_call
+
+    async def call_tool(self, tool_name: str, arguments: Optional[Dict[str, Any]]) -> CallToolResult:
+        if self.before_call is not None:
+            refusal = self.before_call(tool_name, arguments)
+            if refusal:
+                return CallToolResult(content=[TextContent(type="text", text=refusal)], isError=True)
+
+        result = await super().call_tool(tool_name, arguments)
+        if tool_name not in REDUCED_TOOLS or result.isError:
+            return result
+
+        content = []
+        for item in result.content:
+            if isinstance(item, TextContent):
+                item = item.model_copy(update={"text": self.reducer.reduce(tool_name, item.text)})
+            content.append(item)
+        return result.model_copy(update={"content": content})
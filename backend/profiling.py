@@ -0,0 +1,257 @@
+import asyncio
+import collections.abc
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from flask import g, request, jsonify
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts
+
+    Sampling only looks at the target thread, so concurrent requests do not leak into
+    each other's profiles and the profiled code runs without tracing overhead.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name=f"stack-sampler-{thread_id}", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.samples
+
+
+class TimedCoroutine(collections.abc.Coroutine):
+    """Wraps a task's coroutine to measure the time spent in each step on the event loop
+
+    The cr_* attributes are forwarded so inspect.getcoroutinestate() works on the task's
+    coroutine; anyio relies on it when cancelling task groups.
+    """
+
+    def __init__(self, coro, record: Dict[str, Any]):
+        self._coro = coro
+        self._record = record
+        self.__name__ = getattr(coro, "__name__", type(coro).__name__)
+        self.__qualname__ = getattr(coro, "__qualname__", self.__name__)
+
+    @property
+    def cr_running(self):
+        return getattr(self._coro, "cr_running", False)
+
+    @property
+    def cr_suspended(self):
+        return getattr(self._coro, "cr_suspended", False)
+
+    @property
+    def cr_frame(self):
+        return getattr(self._coro, "cr_frame", None)
+
+    @property
+    def cr_await(self):
+        return getattr(self._coro, "cr_await", None)
+
+    @property
+    def cr_code(self):
+        return getattr(self._coro, "cr_code", None)
+
+    def _step(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._record["busy_seconds"] += time.perf_counter() - started
+            self._record["steps"] += 1
+
+    def send(self, value):
+        return self._step(self._coro.send, value)
+
+    def throw(self, *args):
+        return self._step(self._coro.throw, *args)
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self
+
+
+class TaskTimer:
+    """Event loop task factory that records lifetime and on-loop busy time per task"""
+
+    def __init__(self):
+        self.tasks: List[Dict[str, Any]] = []
+
+    def __call__(self, loop, coro, **kwargs):
+        record = {
+            "coroutine": getattr(coro, "__qualname__", type(coro).__name__),
+            "created": time.perf_counter(),
+            "busy_seconds": 0.0,
+            "steps": 0,
+        }
+        self.tasks.append(record)
+        task = asyncio.Task(TimedCoroutine(coro, record), loop=loop, **kwargs)
+        record["name"] = task.get_name()
+        task.add_done_callback(lambda _: record.update(wall_seconds=time.perf_counter() - record["created"]))
+        return task
+
+    def report(self) -> List[Dict[str, Any]]:
+        report = []
+        for record in sorted(self.tasks, key=lambda r: r["busy_seconds"], reverse=True):
+            report.append({
+                "name": record.get("name"),
+                "coroutine": record["coroutine"],
+                "steps": record["steps"],
+                "busy_seconds": round(record["busy_seconds"], 4),
+                "wall_seconds": round(record["wall_seconds"], 4) if "wall_seconds" in record else None,
+            })
+        return report
+
+
+class Profiler:
+    """Opt-in sampling profiler for live requests and background news jobs"""
+
+    def __init__(self, profile_dir: str, admin_token: Optional[str], interval: float = 0.005):
+        self.profile_dir = profile_dir
+        self.admin_token = admin_token
+        self.interval = interval
+        self.remaining = {"requests": 0, "jobs": 0}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        return cls(
+            # Absolute, since send_from_directory resolves relative paths against the app root
+            profile_dir=os.path.abspath(os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))),
+            admin_token=os.environ.get("ADMIN_TOKEN"),
+            interval=float(os.environ.get("PROFILE_SAMPLE_INTERVAL", 0.005)),
+        )
+
+    def is_admin(self) -> bool:
+        token = request.headers.get("X-Admin-Token")
+        return bool(self.admin_token) and token is not None and hmac.compare_digest(token.encode(), self.admin_token.encode())
+
+    def arm(self, requests: int = 0, jobs: int = 0) -> Dict[str, int]:
+        """Profile the next `requests` requests and `jobs` news jobs"""
+        with self.lock:
+            self.remaining["requests"] = max(requests, 0)
+            self.remaining["jobs"] = max(jobs, 0)
+            return dict(self.remaining)
+
+    def take(self, kind: str) -> bool:
+        with self.lock:
+            if self.remaining[kind] > 0:
+                self.remaining[kind] -= 1
+                return True
+            return False
+
+    @contextmanager
+    def capture(self, kind: str, label: str, task_timer: Optional[TaskTimer] = None):
+        """Sample the current thread while the block runs and write a dump; yields the dump name"""
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        started = time.perf_counter()
+        name = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{kind}-{re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')}"
+        sampler.start()
+        try:
+            yield name
+        finally:
+            samples = sampler.stop()
+            self._write(name, {
+                "kind": kind,
+                "label": label,
+                "seconds": round(time.perf_counter() - started, 4),
+                "interval": self.interval,
+                "sample_count": sum(samples.values()),
+                "tasks": task_timer.report() if task_timer else None,
+            }, samples)
+
+    def _write(self, name: str, meta: Dict[str, Any], samples: Counter):
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            # Folded stacks load directly into speedscope or flamegraph.pl
+            with open(os.path.join(self.profile_dir, f"{name}.folded"), "w") as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            with open(os.path.join(self.profile_dir, f"{name}.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+        except OSError as e:
+            print(f"Failed to write profile {name}: {e}")
+
+    def list_dumps(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.profile_dir):
+            return []
+        dumps = []
+        for filename in sorted(os.listdir(self.profile_dir), reverse=True):
+            path = os.path.join(self.profile_dir, filename)
+            dumps.append({"name": filename, "bytes": os.path.getsize(path)})
+        return dumps
+
+    def init_app(self, app, skip_paths=("/health",), skip_prefixes=("/api/admin/",)):
+        """Profile requests sent with X-Profile: 1 by an admin, or armed via arm()
+
+        Armed profiles are not spent on CORS preflights, health checks or admin calls.
+        """
+
+        def countable() -> bool:
+            return (
+                request.method != "OPTIONS"
+                and request.path not in skip_paths
+                and not request.path.startswith(skip_prefixes)
+            )
+
+        @app.before_request
+        def start_request_profile():
+            wanted = request.headers.get("X-Profile") == "1" and self.is_admin()
+            if wanted or (countable() and self.take("requests")):
+                g.profile_capture = self.capture("request", f"{request.method} {request.path}")
+                g.profile_name = g.profile_capture.__enter__()
+
+        @app.after_request
+        def tag_request_profile(response):
+            if "profile_name" in g:
+                response.headers["X-Profile-Dump"] = g.profile_name
+            return response
+
+        @app.teardown_request
+        def finish_request_profile(exc):
+            capture = g.pop("profile_capture", None)
+            if capture is not None:
+                capture.__exit__(None, None, None)
+
+
+def require_admin(profiler: Profiler):
+    """Decorator for admin endpoints; disabled entirely when ADMIN_TOKEN is unset"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not profiler.is_admin():
+                return jsonify({'error': 'Admin token required'}), 403
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
@@ -0,0 +1,248 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+from flask import request, jsonify
+
+
+class Overloaded(Exception):
+    """Raised when an upstream dependency has no capacity left for another call"""
+
+    def __init__(self, upstream: str, retry_after: int):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(f"{upstream} is overloaded, retry after {retry_after}s")
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1) -> Tuple[bool, float]:
+        """Take tokens if available; otherwise return how many seconds until they will be"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True, 0.0
+            return False, (tokens - self.tokens) / self.rate
+
+
+class KeyedRateLimiter:
+    """One token bucket per key (user id or client address)"""
+
+    def __init__(self, name: str, per_minute: float, burst: float, max_keys: int = 10_000):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, per_minute: float, burst: Optional[float] = None) -> "KeyedRateLimiter":
+        """Read RATE_LIMIT_<NAME>_PER_MINUTE and RATE_LIMIT_<NAME>_BURST"""
+        prefix = f"RATE_LIMIT_{name.upper()}"
+        per_minute = float(os.environ.get(f"{prefix}_PER_MINUTE", per_minute))
+        burst = float(os.environ.get(f"{prefix}_BURST", burst or max(per_minute / 4, 1)))
+        return cls(name, per_minute, burst)
+
+    def try_acquire(self, key: str) -> Tuple[bool, float]:
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= self.max_keys:
+                    self._prune()
+                bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket.try_acquire()
+
+    def _prune(self):
+        # Drop buckets that have refilled completely; they behave the same as new ones
+        now = time.monotonic()
+        full = [key for key, bucket in self.buckets.items()
+                if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity]
+        for key in full:
+            del self.buckets[key]
+
+
+class UpstreamLimiter:
+    """Concurrency limit, bounded wait queue and call rate for one upstream dependency"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, per_minute: float,
+                 default_latency: float = 5.0):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.bucket = TokenBucket(per_minute / 60.0, max(concurrency + max_queue, 1))
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        # Queue positions promised to admitted work that has not asked for its slot yet
+        self.reserved = 0
+        # Exponentially weighted average call latency, used to estimate Retry-After
+        self.avg_latency = default_latency
+
+    @classmethod
+    def from_env(cls, name: str, concurrency: int, max_queue: int, per_minute: float,
+                 default_latency: float = 5.0) -> "UpstreamLimiter":
+        """Read UPSTREAM_<NAME>_CONCURRENCY, UPSTREAM_<NAME>_QUEUE and UPSTREAM_<NAME>_PER_MINUTE"""
+        prefix = f"UPSTREAM_{name.upper()}"
+        return cls(
+            name,
+            concurrency=int(os.environ.get(f"{prefix}_CONCURRENCY", concurrency)),
+            max_queue=int(os.environ.get(f"{prefix}_QUEUE", max_queue)),
+            per_minute=float(os.environ.get(f"{prefix}_PER_MINUTE", per_minute)),
+            default_latency=default_latency,
+        )
+
+    def queue_depth(self) -> int:
+        return self.active + self.waiting + self.reserved
+
+    def has_capacity(self) -> bool:
+        return self.queue_depth() < self.concurrency + self.max_queue
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from the current queue depth and average latency"""
+        waves = (self.queue_depth() + 1) / max(self.concurrency, 1)
+        return max(1, math.ceil(waves * self.avg_latency))
+
+    def reserve(self, reject_when_full: bool = True):
+        """Hold a queue position for work admitted now that will call slot(reserved=True) later
+
+        Raises Overloaded when the wait queue is full, so concurrent admissions cannot
+        all pass the capacity check before any of them starts waiting.
+        """
+        with self.lock:
+            if reject_when_full and not self.has_capacity():
+                raise Overloaded(self.name, self.retry_after())
+            self.reserved += 1
+
+    def release_reservation(self):
+        """Give back a reserved queue position whose work will not run"""
+        with self.lock:
+            self.reserved = max(self.reserved - 1, 0)
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None, reject_when_full: bool = True, reserved: bool = False):
+        """Hold one upstream slot for the duration of a call
+
+        Raises Overloaded when the wait queue is full, the call rate is exhausted
+        or no slot frees up within `timeout` seconds. With reject_when_full=False the
+        call waits for capacity and a rate token instead. With reserved=True the
+        caller's queue position was taken by reserve() and is converted here.
+        """
+        with self.lock:
+            if reserved:
+                self.reserved = max(self.reserved - 1, 0)
+            elif reject_when_full and not self.has_capacity():
+                raise Overloaded(self.name, self.retry_after())
+            self.waiting += 1
+
+        try:
+            ok, wait = self.bucket.try_acquire()
+            while not ok:
+                if reject_when_full:
+                    raise Overloaded(self.name, math.ceil(wait))
+                time.sleep(wait)
+                ok, wait = self.bucket.try_acquire()
+            if not self.semaphore.acquire(timeout=timeout):
+                raise Overloaded(self.name, self.retry_after())
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+        with self.lock:
+            self.active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self.lock:
+                self.active -= 1
+                self.avg_latency = 0.8 * self.avg_latency + 0.2 * elapsed
+            self.semaphore.release()
+
+    @asynccontextmanager
+    async def async_slot(self, timeout: Optional[float] = None, reject_when_full: bool = True):
+        """slot() for coroutines; waits for the slot in a worker thread so the event loop keeps running"""
+        held = self.slot(timeout=timeout, reject_when_full=reject_when_full)
+        await asyncio.to_thread(held.__enter__)
+        try:
+            yield
+        finally:
+            held.__exit__(None, None, None)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "reserved": self.reserved,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "avg_latency": round(self.avg_latency, 2),
+        }
+
+
+def client_key() -> str:
+    """Rate limit key: the authenticated user if known, otherwise the client address"""
+    user_id = getattr(request, 'user_id', None)
+    if user_id:
+        return f"user:{user_id}"
+    # X-Forwarded-For is client-controlled; it is only applied (by ProxyFix) for trusted proxies
+    return f"ip:{request.remote_addr}"
+
+
+def too_many_requests(retry_after: float):
+    response = jsonify({'error': 'Too many requests', 'retry_after': math.ceil(retry_after)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+def overloaded_response(e: Overloaded):
+    response = jsonify({'error': f'{e.upstream} is busy, please retry later', 'retry_after': e.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+def rate_limited(limiter: KeyedRateLimiter):
+    """Decorator that applies a per-user token bucket, answering 429 with Retry-After"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            ok, retry_after = limiter.try_acquire(client_key())
+            if not ok:
+                return too_many_requests(retry_after)
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def uses_upstream(limiter: UpstreamLimiter, timeout: float = 10.0):
+    """Decorator that holds an upstream slot for the whole request, answering 503 when overloaded"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                with limiter.slot(timeout=timeout):
+                    return f(*args, **kwargs)
+            except Overloaded as e:
+                return overloaded_response(e)
+        return decorated
+    return decorator
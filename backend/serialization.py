@@ -0,0 +1,177 @@
+import gzip
+import io
+import os
+import zlib
+from typing import Any, Iterable, Iterator
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+# Optional accelerators; everything falls back to the standard library when they are missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/plain", "text/html", "text/markdown"}
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson, writing response bytes directly"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # orjson has no equivalent for most json.dumps arguments (cls, separators, ...)
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        data = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+
+def _accepted_encoding() -> str | None:
+    """Pick br or gzip from the request's Accept-Encoding, preferring br when available"""
+    accept = request.accept_encodings
+    if brotli is not None and accept.quality("br") > 0:
+        return "br"
+    if accept.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def _compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+
+
+def _compress_stream(chunks: Iterable[Any], encoding: str, level: int) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk, flushing so each chunk reaches the client promptly"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=min(level, 11))
+        for chunk in chunks:
+            data = chunk.encode() if isinstance(chunk, str) else chunk
+            out = compressor.process(data) + compressor.flush()
+            if out:
+                yield out
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(min(level, 9), zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = chunk.encode() if isinstance(chunk, str) else chunk
+            out = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield compressor.flush()
+
+
+class _DecompressingStream(io.RawIOBase):
+    """Readable stream that decompresses a request body as it is read"""
+
+    def __init__(self, raw, encoding: str, max_bytes: int):
+        self.raw = raw
+        self.max_bytes = max_bytes
+        self.total = 0
+        self.buffer = b""
+        self.finished = False
+        if encoding == "br":
+            self.decompressor = brotli.Decompressor()
+            self.decompress = self.decompressor.process
+            self.flush = lambda: b""
+        else:
+            # 47 accepts gzip or zlib headers; deflate is zlib-wrapped per RFC 9110
+            self.decompressor = zlib.decompressobj(47 if encoding == "gzip" else 15)
+            self.decompress = self.decompressor.decompress
+            self.flush = self.decompressor.flush
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self.buffer and not self.finished:
+            chunk = self.raw.read(16384)
+            try:
+                self.buffer = self.decompress(chunk) if chunk else self.flush()
+            except Exception:
+                raise BadRequest("Invalid compressed request body")
+            if not chunk:
+                self.finished = True
+            self.total += len(self.buffer)
+            if self.total > self.max_bytes:
+                raise RequestEntityTooLarge()
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+
+class DecompressRequestMiddleware:
+    """WSGI middleware that transparently accepts gzip, deflate or br request bodies"""
+
+    def __init__(self, wsgi_app, max_bytes: int):
+        self.wsgi_app = wsgi_app
+        self.max_bytes = max_bytes
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding in ("gzip", "deflate") or (encoding == "br" and brotli is not None):
+            stream = _DecompressingStream(environ["wsgi.input"], encoding, self.max_bytes)
+            environ["wsgi.input"] = io.BufferedReader(stream)
+            # The decompressed length is unknown; read until the stream ends
+            environ["wsgi.input_terminated"] = True
+            environ.pop("CONTENT_LENGTH", None)
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.wsgi_app(environ, start_response)
+
+
+def init_app(app):
+    """Install the JSON provider, response compression and request decompression"""
+    if os.environ.get("JSON_SERIALIZER", "orjson") == "orjson" and orjson is not None:
+        app.json = OrjsonProvider(app)
+
+    min_bytes = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+    level = int(os.environ.get("COMPRESS_LEVEL", 6))
+    app.wsgi_app = DecompressRequestMiddleware(
+        app.wsgi_app, int(os.environ.get("MAX_DECOMPRESSED_REQUEST_BYTES", 256 * 1024 * 1024))
+    )
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        encoding = _accepted_encoding()
+        response.vary.add("Accept-Encoding")
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, level)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < min_bytes:
+                return response
+            response.set_data(_compress(data, encoding, level))
+
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,150 @@
+import importlib.util
+import math
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import httpx
+from flask import g, has_app_context
+from supabase import create_client, Client, ClientOptions
+
+from rate_limit import Overloaded, overloaded_response
+
+# httpx only negotiates HTTP/2 when the optional h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class PoolTimeout(Overloaded):
+    """Raised when no Supabase client frees up within the acquire timeout (answered with 503)"""
+
+
+class SupabasePool:
+    """Bounded pool of Supabase clients with tuned keep-alive HTTP sessions
+
+    Each pooled client keeps its own PostgREST connection pool warm, so requests and
+    background jobs reuse connections instead of contending for one shared client.
+    Inside a request, `current()` hands out one client per request (released on app
+    context teardown); elsewhere use `with pool.connection() as client:`.
+    """
+
+    def __init__(self, url: str, key: str, size: int = 8, timeout: float = 10.0,
+                 acquire_timeout: float = 5.0, keepalive_connections: int = 4, http2: bool = True):
+        self.url = url
+        self.key = key
+        self.size = size
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.keepalive_connections = keepalive_connections
+        self.http2 = http2 and HTTP2_AVAILABLE
+        # LIFO so the most recently used client, with the warmest connections, goes out first
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> "SupabasePool":
+        """Build a pool from SUPABASE_* environment variables"""
+        return cls(
+            os.environ.get("SUPABASE_URL"),
+            os.environ.get("SUPABASE_KEY"),
+            size=int(os.environ.get("SUPABASE_POOL_SIZE", 8)),
+            timeout=float(os.environ.get("SUPABASE_TIMEOUT", 10)),
+            acquire_timeout=float(os.environ.get("SUPABASE_POOL_ACQUIRE_TIMEOUT", 5)),
+            keepalive_connections=int(os.environ.get("SUPABASE_KEEPALIVE_CONNECTIONS", 4)),
+            http2=os.environ.get("SUPABASE_HTTP2", "true") == "true",
+        )
+
+    def _create(self) -> Client:
+        client = create_client(self.url, self.key, options=ClientOptions(postgrest_client_timeout=self.timeout))
+        # Replace the default PostgREST session with one sized for this pool
+        postgrest = client.postgrest
+        session = getattr(postgrest, "session", None)
+        if isinstance(session, httpx.Client):
+            postgrest.session = httpx.Client(
+                base_url=session.base_url,
+                headers=session.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.keepalive_connections * 2,
+                    max_keepalive_connections=self.keepalive_connections,
+                ),
+                http2=self.http2,
+                follow_redirects=True,
+            )
+            session.close()
+        return client
+
+    def _acquire(self) -> Client:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            print(f"No Supabase client available after {self.acquire_timeout}s (pool size {self.size})")
+            raise PoolTimeout("supabase", max(1, math.ceil(self.acquire_timeout)))
+
+    def _release(self, client: Client):
+        self._idle.put(client)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a client for the block, reusing one already held by this thread or request"""
+        bound = getattr(self._local, "client", None)
+        if bound is not None:
+            yield bound
+            return
+        if has_app_context() and "supabase_client" in g:
+            yield g.supabase_client
+            return
+
+        client = self._acquire()
+        self._local.client = client
+        try:
+            yield client
+        finally:
+            self._local.client = None
+            self._release(client)
+
+    def current(self) -> Client:
+        """The client bound to this thread or request, acquiring one for the request if needed"""
+        bound = getattr(self._local, "client", None)
+        if bound is not None:
+            return bound
+        if not has_app_context():
+            raise RuntimeError("Outside a request, use `with supabase_pool.connection()` to borrow a client")
+        if "supabase_client" not in g:
+            g.supabase_client = self._acquire()
+        return g.supabase_client
+
+    def release(self):
+        """Return the current request's client early, e.g. before streaming a long response"""
+        client = g.pop("supabase_client", None)
+        if client is not None:
+            self._release(client)
+
+    def init_app(self, app):
+        app.register_error_handler(PoolTimeout, overloaded_response)
+
+        @app.teardown_appcontext
+        def release_supabase_client(exc):
+            self.release()
+
+    def stats(self):
+        return {"size": self.size, "created": self._created, "idle": self._idle.qsize(), "http2": self.http2}
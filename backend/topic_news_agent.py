@@ -1,41 +1,73 @@
 import asyncio
 import os
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 from datetime import datetime
 
 from agents import Agent, Runner, enable_verbose_stdout_logging, gen_trace_id, trace
-from agents.mcp import MCPServerSse
+from agents.exceptions import AgentsException, MaxTurnsExceeded
 from agents.model_settings import ModelSettings
 
+from news_budget import NewsBudget, BudgetTracker
+from page_reducer import PageReducer, ReducingMCPServerSse
+
 load_dotenv()
 
 enable_verbose_stdout_logging()
 
 
-async def fetch_topic_news(topics: List[str]) -> Dict[str, Any]:
+async def summarize_findings(research_prompt: str, tracker: BudgetTracker) -> str:
+    """Produce a best-effort summary from what the agent gathered before its budget ran out"""
+    summary_agent = Agent(
+        name="NewsSummaryAgent",
+        instructions="""You write concise markdown news summaries. You have no tools: use only the research notes you are given,
+say so briefly when a topic could not be covered, and always include the source URLs found in the notes.""",
+        model="gpt-4.1-nano",
+    )
+    findings = tracker.findings_digest() or "(no research notes were collected)"
+    summary_prompt = f"""{research_prompt}
+
+The research budget ran out ({tracker.exhausted}) before the research finished. Write the best summary you can
+from these research notes only:
+
+{findings}"""
+    result = await asyncio.wait_for(
+        Runner.run(starting_agent=summary_agent, input=summary_prompt, max_turns=1),
+        timeout=tracker.budget.summary_seconds,
+    )
+    tracker.add_usage(result.context_wrapper.usage)
+    return result.final_output
+
+
+async def fetch_topic_news(topics: List[str], budget: Optional[NewsBudget] = None) -> Dict[str, Any]:
     """
     Fetch recent news and developments for given topics using the dex-mcp server.
     
     Args:
         topics: List of topic strings (e.g., ["computer science", "biology", "AI"])
+        budget: Token, tool call, turn and wall-clock limits (defaults to NEWS_BUDGET_* env vars)
         
     Returns:
         Dictionary containing:
         - summary_markdown: Formatted summary of findings
-        - raw_results: Raw results from the browser automation
+        - raw_results: Raw results from the browser automation, including budget consumption
         - error: Error message if something went wrong
     """
+    budget = (budget or NewsBudget.from_env()).for_topics(len(topics))
+    tracker = BudgetTracker(budget, topics)
+    reducer = PageReducer()
     try:
-        # Connect to the dex-mcp server via SSE
-        async with MCPServerSse(
+        # Connect to the dex-mcp server via SSE; page content is reduced before it reaches the model
+        async with ReducingMCPServerSse(
             name="Dex MCP Server",
             params={
                 "url": "http://localhost:8000/sse",
                 "timeout": 20
             },
             client_session_timeout_seconds=30,
+            reducer=reducer,
+            before_call=tracker.before_tool_call,
         ) as server:
             
             # Create an agent with access to browser automation tools
@@ -90,14 +122,41 @@ To aid in your search, note that the current date is {datetime.now().strftime("%
             # Use trace for debugging if needed
             trace_id = gen_trace_id()
             with trace(workflow_name="Topic News Research", trace_id=trace_id):
-                result = await Runner.run(starting_agent=agent, input=research_prompt, max_turns=20)
-                
+                result = None
+                try:
+                    result = await asyncio.wait_for(
+                        Runner.run(
+                            starting_agent=agent,
+                            input=research_prompt,
+                            max_turns=budget.max_turns,
+                            hooks=tracker,
+                        ),
+                        timeout=budget.max_seconds,
+                    )
+                    tracker.record_usage(result.context_wrapper)
+                except MaxTurnsExceeded:
+                    tracker.mark_exhausted("turns")
+                except AgentsException:
+                    # BudgetExceeded is raised inside the tool call and reaches us wrapped by the SDK
+                    if not tracker.exhausted:
+                        raise
+                except asyncio.TimeoutError:
+                    tracker.mark_exhausted("wall_clock")
+
+                if result is not None:
+                    summary_markdown = result.final_output
+                else:
+                    # Out of budget: summarize what we already have instead of failing the job
+                    summary_markdown = await summarize_findings(research_prompt, tracker)
+
                 return {
-                    "summary_markdown": result.final_output,
+                    "summary_markdown": summary_markdown,
                     "raw_results": {
                         "trace_id": trace_id,
                         "topics_searched": topics,
-                        "agent_messages": result.messages if hasattr(result, 'messages') else []
+                        "agent_messages": result.messages if hasattr(result, 'messages') else [],
+                        "budget": tracker.report(),
+                        "page_reduction": reducer.stats()
                     }
                 }
                 
@@ -105,7 +164,7 @@ To aid in your search, note that the current date is {datetime.now().strftime("%
         return {
             "error": f"Failed to fetch topic news: {str(e)}",
             "summary_markdown": "",
-            "raw_results": {}
+            "raw_results": {"budget": tracker.report()}
         }
 
 
@@ -118,6 +177,7 @@ async def test_fetch_topic_news():
     print(f"Error: {result.get('error', 'None')}")
     print(f"Summary length: {len(result.get('summary_markdown', ''))}")
     print(f"Raw results keys: {list(result.get('raw_results', {}).keys())}")
+    print(f"Budget: {result.get('raw_results', {}).get('budget')}")
     
     if result.get('summary_markdown'):
         print("\nSummary:")
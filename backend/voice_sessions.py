@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limit import Overloaded, UpstreamLimiter
+
+REALTIME_MODEL = "gpt-4o-realtime-preview-2024-12-17"
+# Key for sessions minted with generic instructions; the client applies topic instructions
+GENERIC = ""
+
+
+def voice_instructions(topic: str) -> str:
+    """Instructions for the realtime voice tutor"""
+    return f"""You are an engaging educational assistant teaching about {topic}.
+
+Your role:
+- Start by giving an interesting 30-60 second overview of {topic}
+- Speak in a conversational, podcast-like manner
+- Speak quickly, like the podcast is at 2x speed
+- Allow the user to interrupt with questions at any time
+- Keep responses engaging but not too long (30-60 seconds each)
+- If the user asks to explore a specific aspect, dive deeper into that area
+- Encourage curiosity and questions
+
+Remember: This is an interactive learning conversation, not a lecture. Be enthusiastic about the topic and make it accessible."""
+
+
+class VoiceSessionError(Exception):
+    """The realtime sessions API refused to create a session"""
+
+    def __init__(self, status_code: int, details: str):
+        self.status_code = status_code
+        self.details = details
+        super().__init__(f"Failed to create session ({status_code})")
+
+
+class VoiceSessionPool:
+    """Pre-minted realtime sessions, refilled in the background and evicted before they expire
+
+    Generic sessions are kept warm for any topic while the pool is in use; the client switches
+    them to the topic with a session.update. Once no session has been asked for or prewarmed
+    for `idle_window` seconds, expiring generic sessions are no longer replaced. Topic
+    sessions are minted on request (e.g. when a node's menu opens) and are ready to use as-is.
+    """
+
+    def __init__(self, api_key: Optional[str], url: str, generic_size: int = 2, max_topics: int = 20,
+                 evict_margin: float = 15.0, default_ttl: float = 60.0, timeout: float = 10.0,
+                 idle_window: float = 600.0, upstream: Optional[UpstreamLimiter] = None):
+        self.api_key = api_key
+        self.url = url
+        self.generic_size = generic_size
+        self.max_topics = max_topics
+        self.evict_margin = evict_margin
+        self.default_ttl = default_ttl
+        self.timeout = timeout
+        self.idle_window = idle_window
+        self.upstream = upstream
+
+        # One keep-alive session for every call to the sessions API
+        self.http = requests.Session()
+        self.http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=8))
+        self.http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=8))
+        self.http.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+        self.sessions: Dict[str, deque] = {GENERIC: deque()}
+        self.wanted_topics: "OrderedDict[str, None]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_used = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, upstream: Optional[UpstreamLimiter] = None) -> "VoiceSessionPool":
+        """Build a pool from OPENAI_* and VOICE_SESSION_* environment variables"""
+        return cls(
+            os.environ.get("OPENAI_API_KEY"),
+            os.environ.get("OPENAI_REALTIME_SESSIONS_URL", "https://api.openai.com/v1/realtime/sessions"),
+            generic_size=int(os.environ.get("VOICE_SESSION_POOL_SIZE", 2)),
+            max_topics=int(os.environ.get("VOICE_SESSION_MAX_TOPICS", 20)),
+            evict_margin=float(os.environ.get("VOICE_SESSION_EVICT_MARGIN", 15)),
+            timeout=float(os.environ.get("VOICE_SESSION_TIMEOUT", 10)),
+            idle_window=float(os.environ.get("VOICE_SESSION_IDLE_WINDOW", 600)),
+            upstream=upstream,
+        )
+
+    def mint(self, instructions: str) -> Dict[str, Any]:
+        """Create a realtime session upstream"""
+        response = self.http.post(self.url, json={
+            "model": REALTIME_MODEL,
+            "voice": "alloy",
+            "instructions": instructions,
+        }, timeout=self.timeout)
+        if response.status_code != 200:
+            raise VoiceSessionError(response.status_code, response.text)
+        return response.json()
+
+    def _expires_at(self, session: Dict[str, Any]) -> float:
+        expires_at = (session.get("client_secret") or {}).get("expires_at")
+        return float(expires_at) if expires_at else time.time() + self.default_ttl
+
+    def _fresh(self, session: Dict[str, Any]) -> bool:
+        return self._expires_at(session) - time.time() > self.evict_margin
+
+    def _take(self, key: str) -> Optional[Dict[str, Any]]:
+        queue = self.sessions.get(key)
+        while queue:
+            session = queue.popleft()
+            if self._fresh(session):
+                return session
+        return None
+
+    def get(self, topic: str) -> Tuple[Dict[str, Any], bool]:
+        """Return (session, needs_topic_update), minting synchronously only if the pool is empty
+
+        Only a synchronous mint takes an upstream slot; raises Overloaded when none frees up.
+        """
+        self._ensure_started()
+        with self.lock:
+            self.last_used = time.monotonic()
+            session = self._take(topic)
+            needs_update = False
+            if session is None:
+                session = self._take(GENERIC)
+                needs_update = session is not None
+        self.wake.set()
+
+        if session is not None:
+            self.hits += 1
+            return session, needs_update
+        self.misses += 1
+        if self.upstream is None:
+            return self.mint(voice_instructions(topic)), False
+        with self.upstream.slot(timeout=self.timeout):
+            return self.mint(voice_instructions(topic)), False
+
+    def prewarm(self, topic: str):
+        """Ask the refill thread to mint a session for this topic"""
+        self._ensure_started()
+        with self.lock:
+            self.last_used = time.monotonic()
+            self.wanted_topics[topic] = None
+            self.wanted_topics.move_to_end(topic)
+            while len(self.wanted_topics) > self.max_topics:
+                self.wanted_topics.popitem(last=False)
+        self.wake.set()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self.lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._refill_loop, name="voice-session-refill", daemon=True)
+                    self._thread.start()
+
+    def _idle(self) -> bool:
+        return time.monotonic() - self.last_used > self.idle_window
+
+    def _refill_loop(self):
+        while True:
+            try:
+                self._refill_once()
+            except Exception as e:
+                print(f"Voice session refill error: {e}")
+            # An idle pool sleeps until the next get() or prewarm() wakes it
+            self.wake.wait(timeout=None if self._idle() else max(self.evict_margin / 3, 1))
+            self.wake.clear()
+
+    def _refill_once(self):
+        with self.lock:
+            # Evict sessions that would expire before a client could use them
+            for key in list(self.sessions):
+                fresh = deque(s for s in self.sessions[key] if self._fresh(s))
+                if fresh or key == GENERIC:
+                    self.sessions[key] = fresh
+                else:
+                    del self.sessions[key]
+            generic_missing = 0 if self._idle() else self.generic_size - len(self.sessions[GENERIC])
+            topics = [topic for topic in self.wanted_topics if not self.sessions.get(topic)]
+            self.wanted_topics.clear()
+
+        jobs = [(topic, voice_instructions(topic)) for topic in topics]
+        jobs += [(GENERIC, voice_instructions("the topic you will be given"))] * max(generic_missing, 0)
+        for key, instructions in jobs:
+            session = self._mint_in_background(instructions)
+            if session is None:
+                return
+            with self.lock:
+                self.sessions.setdefault(key, deque()).append(session)
+
+    def _mint_in_background(self, instructions: str) -> Optional[Dict[str, Any]]:
+        if self.upstream is None:
+            return self.mint(instructions)
+        # Background minting yields to live requests when the upstream is busy
+        try:
+            with self.upstream.slot(timeout=0):
+                return self.mint(instructions)
+        except Overloaded:
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            pooled = {key or "generic": len(queue) for key, queue in self.sessions.items()}
+        return {"pooled": pooled, "hits": self.hits, "misses": self.misses, "idle": self._idle()}
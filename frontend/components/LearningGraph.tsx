@@ -1,13 +1,13 @@
 "use client";
 
-import { useEffect, useState, useCallback } from 'react';
+import { useEffect, useState, useCallback, useRef } from 'react';
 import dynamic from 'next/dynamic';
 import { useAuth } from './AuthProvider';
 import ContextMenu from './ContextMenu';
 import VoiceConversation from './VoiceConversation';
 import NotesModal from './NotesModal';
 import AddTopicModal from './AddTopicModal';
-import { saveUserData, loadUserData } from '../lib/api';
+import { saveUserData, loadUserData, loadTopicNotes, saveTopicNotes, NotesConflictError, prewarmVoiceSession } from '../lib/api';
 
 // Dynamic import to avoid SSR issues
 const ForceGraph2D = dynamic(() => import('react-force-graph-2d'), {
@@ -31,9 +31,18 @@ interface GraphNode {
 
 interface NodeMetadata {
   expanded: boolean;
+}
+
+interface TopicNotes {
   notes: string;
 }
 
+interface NotesConflict {
+  nodeId: string;
+  theirs: string;
+  version: number;
+}
+
 interface Link {
   source: string;
   target: string;
@@ -53,6 +62,15 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
   
   // Store node metadata separately to avoid breaking graph structure
   const [nodeMetadata, setNodeMetadata] = useState<Record<string, NodeMetadata>>({});
+  // Notes are saved per node with PATCH and kept out of the graph autosave below
+  const [topicNotes, setTopicNotes] = useState<Record<string, TopicNotes>>({});
+  // Topics known to exist on the server; notes for newer ones wait for the next graph save
+  const savedNodeIds = useRef<Set<string>>(new Set());
+  const pendingNotes = useRef<Record<string, string>>({});
+  // Server versions live in a ref so a save started right after another sees its result
+  const noteVersions = useRef<Record<string, number>>({});
+  const noteSaves = useRef<Record<string, Promise<void>>>({});
+  const [notesConflict, setNotesConflict] = useState<NotesConflict | null>(null);
   const [isLoading, setIsLoading] = useState(true);
   const [saveStatus, setSaveStatus] = useState<'idle' | 'saving' | 'saved' | 'error'>('idle');
   const [contextMenu, setContextMenu] = useState<{
@@ -89,6 +107,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
         if (skipInitialLoad) {
           // Coming from home page after detecting existing data, just load it
           const userData = await loadUserData();
+          savedNodeIds.current = new Set(userData.nodes.map(node => node.id));
           setGraphData({ nodes: userData.nodes, links: userData.links });
           setNodeMetadata(userData.metadata);
         } else {
@@ -97,6 +116,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
           
           if (userData.nodes.length > 0) {
             // User has existing data
+            savedNodeIds.current = new Set(userData.nodes.map(node => node.id));
             setGraphData({ nodes: userData.nodes, links: userData.links });
             setNodeMetadata(userData.metadata);
           } else {
@@ -111,8 +131,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
             const initialMetadata: Record<string, NodeMetadata> = {};
             initialNodes.forEach(node => {
               initialMetadata[node.id] = {
-                expanded: false,
-                notes: ''
+                expanded: false
               };
             });
             
@@ -122,6 +141,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
             // Save initial data
             if (initialNodes.length > 0) {
               await saveUserData(initialNodes, initialMetadata, []);
+              savedNodeIds.current = new Set(initialNodes.map(node => node.id));
             }
           }
         }
@@ -138,8 +158,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
         const initialMetadata: Record<string, NodeMetadata> = {};
         initialNodes.forEach(node => {
           initialMetadata[node.id] = {
-            expanded: false,
-            notes: ''
+            expanded: false
           };
         });
         
@@ -185,8 +204,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
       const newMetadata: Record<string, NodeMetadata> = {};
       newNodes.forEach(newNode => {
         newMetadata[newNode.id] = {
-          expanded: false,
-          notes: ''
+          expanded: false
         };
       });
 
@@ -233,6 +251,8 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
 
   const handleNodeRightClick = useCallback((node: GraphNode, event: MouseEvent) => {
     event.preventDefault();
+    // The context menu offers a voice conversation; get its session ready
+    prewarmVoiceSession(node.name);
     setContextMenu({
       visible: true,
       x: event.pageX,
@@ -253,9 +273,77 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
     setContextMenu(prev => ({ ...prev, visible: false }));
   };
 
+  const ensureNotesLoaded = async (nodeId: string): Promise<number> => {
+    const version = noteVersions.current[nodeId];
+    if (version !== undefined) return version;
+    // A topic the server hasn't seen yet has no notes there
+    if (!savedNodeIds.current.has(nodeId)) return 0;
+
+    const loaded = await loadTopicNotes(nodeId);
+    noteVersions.current[nodeId] = loaded.version;
+    // Keep notes edited locally while they were loading
+    setTopicNotes(prev => ({
+      ...prev,
+      [nodeId]: prev[nodeId] ?? { notes: loaded.notes }
+    }));
+    return loaded.version;
+  };
+
+  const saveNotesNow = async (nodeId: string, notes: string) => {
+    try {
+      const version = await ensureNotesLoaded(nodeId);
+      const saved = await saveTopicNotes(nodeId, notes, version);
+      noteVersions.current[nodeId] = saved.version;
+    } catch (error) {
+      if (error instanceof NotesConflictError) {
+        // Someone else saved first; keep the user's text and let them choose
+        setNotesConflict({ nodeId, theirs: error.notes, version: error.version });
+      }
+      console.error('Error saving notes:', error);
+    }
+  };
+
+  const persistNotes = (nodeId: string, notes: string) => {
+    if (!savedNodeIds.current.has(nodeId)) {
+      // The PATCH would 404 until the debounced graph save creates the topic
+      pendingNotes.current[nodeId] = notes;
+      return;
+    }
+    // One save per node at a time, so each save sends the version the previous one returned
+    const next = (noteSaves.current[nodeId] ?? Promise.resolve()).then(() => saveNotesNow(nodeId, notes));
+    noteSaves.current[nodeId] = next;
+    next.then(() => {
+      if (noteSaves.current[nodeId] === next) delete noteSaves.current[nodeId];
+    });
+  };
+
+  const resolveNotesConflict = (keepMine: boolean) => {
+    if (!notesConflict) return;
+    const { nodeId, theirs, version } = notesConflict;
+    setNotesConflict(null);
+    noteVersions.current[nodeId] = version;
+    if (keepMine) {
+      persistNotes(nodeId, topicNotes[nodeId]?.notes ?? '');
+    } else {
+      setTopicNotes(prev => ({ ...prev, [nodeId]: { notes: theirs } }));
+    }
+  };
+
+  const flushPendingNotes = (nodes: GraphNode[]) => {
+    savedNodeIds.current = new Set(nodes.map(node => node.id));
+    Object.entries(pendingNotes.current).forEach(([nodeId, notes]) => {
+      if (!savedNodeIds.current.has(nodeId)) return;
+      delete pendingNotes.current[nodeId];
+      // The topic was just created, so it has no notes on the server yet
+      noteVersions.current[nodeId] = 0;
+      persistNotes(nodeId, notes);
+    });
+  };
+
   const handleViewNotes = (nodeId: string) => {
     setNotesModal({ visible: true, nodeId });
     setContextMenu(prev => ({ ...prev, visible: false }));
+    ensureNotesLoaded(nodeId).catch(error => console.error('Error loading notes:', error));
   };
 
   const handleDeleteNode = (nodeId: string) => {
@@ -270,15 +358,24 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
       delete newMetadata[nodeId];
       return newMetadata;
     });
+    setTopicNotes(prev => {
+      const newNotes = { ...prev };
+      delete newNotes[nodeId];
+      return newNotes;
+    });
+    delete pendingNotes.current[nodeId];
+    delete noteVersions.current[nodeId];
+    setNotesConflict(prev => (prev?.nodeId === nodeId ? null : prev));
     
     setContextMenu(prev => ({ ...prev, visible: false }));
   };
 
   const handleSaveNotes = (nodeId: string, notes: string) => {
-    setNodeMetadata(prev => ({
+    setTopicNotes(prev => ({
       ...prev,
-      [nodeId]: { ...prev[nodeId], notes }
+      [nodeId]: { notes }
     }));
+    persistNotes(nodeId, notes);
   };
 
   const handleVoiceConversationEnd = async (transcript: string) => {
@@ -300,16 +397,14 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
       if (response.ok) {
         const analysis = await response.json();
         
-        // Update the node metadata with generated notes
+        // Show the generated notes and save them to the topic
         const formattedNotes = `## Summary\n${analysis.summary.map((point: string) => `- ${point}`).join('\n')}\n\n## Key Points\n${analysis.key_points.map((point: string) => `- ${point}`).join('\n')}`;
         
-        setNodeMetadata(prev => ({
+        setTopicNotes(prev => ({
           ...prev,
-          [voiceConversation.nodeId!]: {
-            ...prev[voiceConversation.nodeId!],
-            notes: formattedNotes
-          }
+          [voiceConversation.nodeId!]: { notes: formattedNotes }
         }));
+        persistNotes(voiceConversation.nodeId!, formattedNotes);
 
         // Create new nodes for suggested subtopics if any
         if (analysis.suggested_subtopics && analysis.suggested_subtopics.length > 0) {
@@ -324,8 +419,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
           const newMetadata: Record<string, NodeMetadata> = {};
           newNodes.forEach(newNode => {
             newMetadata[newNode.id] = {
-              expanded: false,
-              notes: ''
+              expanded: false
             };
           });
 
@@ -364,8 +458,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
     const newMetadata: Record<string, NodeMetadata> = {};
     newNodes.forEach(node => {
       newMetadata[node.id] = {
-        expanded: false,
-        notes: ''
+        expanded: false
       };
     });
 
@@ -380,7 +473,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
     }));
   };
 
-  // Auto-save data when it changes
+  // Auto-save the graph when its structure or expanded state changes (notes are saved separately)
   useEffect(() => {
     const saveData = async () => {
       if (!user || isLoading || graphData.nodes.length === 0 || saveStatus === 'saving') return;
@@ -388,6 +481,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
       try {
         setSaveStatus('saving');
         await saveUserData(graphData.nodes, nodeMetadata, graphData.links);
+        flushPendingNotes(graphData.nodes);
         setSaveStatus('saved');
         setTimeout(() => setSaveStatus('idle'), 2000);
       } catch (error) {
@@ -452,6 +546,29 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
         </div>
       )}
 
+      {/* Notes Conflict */}
+      {notesConflict && (
+        <div className="absolute top-16 right-4 z-10 bg-white rounded-lg shadow-lg px-4 py-3 max-w-sm">
+          <p className="text-sm text-gray-800 mb-2">
+            Notes for <strong>{graphData.nodes.find(n => n.id === notesConflict.nodeId)?.name || 'this topic'}</strong> were changed elsewhere since you opened them.
+          </p>
+          <div className="flex gap-2">
+            <button
+              onClick={() => resolveNotesConflict(true)}
+              className="text-xs px-2 py-1 bg-blue-600 hover:bg-blue-700 text-white rounded"
+            >
+              Keep mine
+            </button>
+            <button
+              onClick={() => resolveNotesConflict(false)}
+              className="text-xs px-2 py-1 bg-gray-100 hover:bg-gray-200 rounded text-gray-700"
+            >
+              Use theirs
+            </button>
+          </div>
+        </div>
+      )}
+
       {/* Floating Add Button */}
       <button
         onClick={() => setAddTopicModal(true)}
@@ -542,7 +659,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
           node={{
             id: contextMenu.nodeId,
             name: graphData.nodes.find(n => n.id === contextMenu.nodeId)?.name || '',
-            notes: nodeMetadata[contextMenu.nodeId]?.notes || ''
+            notes: topicNotes[contextMenu.nodeId]?.notes || ''
           }}
           onStartConversation={() => handleStartConversation(contextMenu.nodeId!)}
           onViewNotes={() => handleViewNotes(contextMenu.nodeId!)}
@@ -564,7 +681,7 @@ export default function LearningGraph({ initialInterests, skipInitialLoad = fals
           node={{
             id: notesModal.nodeId,
             name: graphData.nodes.find(n => n.id === notesModal.nodeId)?.name || '',
-            notes: nodeMetadata[notesModal.nodeId]?.notes || ''
+            notes: topicNotes[notesModal.nodeId]?.notes || ''
           }}
           onSave={handleSaveNotes}
           onClose={() => setNotesModal({ visible: false, nodeId: null })}
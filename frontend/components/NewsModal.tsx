@@ -72,7 +72,8 @@ export default function NewsModal({ isOpen, onClose, availableTopics }: NewsModa
     setCurrentSummary(null);
 
     try {
-      const result = await createTopicNewsSummary(selectedTopics);
+      // One key per click, so a retried request reuses the same summary
+      const result = await createTopicNewsSummary(selectedTopics, crypto.randomUUID());
       setPollingSummaryId(result.summary_id);
       
       // Set initial summary state
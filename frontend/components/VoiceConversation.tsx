@@ -79,6 +79,10 @@ export default function VoiceConversation({ topic, onEnd, onClose }: VoiceConver
 
       dc.addEventListener("open", () => {
         console.log("Data channel opened");
+        // Pooled generic sessions are switched to this topic before the conversation starts
+        if (data.session_update) {
+          dc.send(JSON.stringify({ type: "session.update", session: data.session_update }));
+        }
       });
 
       // Start the session using SDP
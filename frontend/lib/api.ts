@@ -9,7 +9,6 @@ interface GraphNode {
 
 interface NodeMetadata {
   expanded: boolean;
-  notes: string;
 }
 
 interface Link {
@@ -28,6 +27,22 @@ interface NewsSummary {
   raw_results?: any;
 }
 
+// Request bodies above this size are gzipped when the browser supports CompressionStream
+const COMPRESS_REQUEST_MIN_BYTES = 8192;
+
+async function encodeJsonBody(payload: unknown): Promise<{ body: BodyInit; headers: Record<string, string> }> {
+  const json = JSON.stringify(payload);
+  if (json.length < COMPRESS_REQUEST_MIN_BYTES || typeof CompressionStream === 'undefined') {
+    return { body: json, headers: { 'Content-Type': 'application/json' } };
+  }
+
+  const stream = new Blob([json]).stream().pipeThrough(new CompressionStream('gzip'));
+  return {
+    body: await new Response(stream).blob(),
+    headers: { 'Content-Type': 'application/json', 'Content-Encoding': 'gzip' }
+  };
+}
+
 export async function saveUserData(
   nodes: GraphNode[],
   metadata: Record<string, NodeMetadata>,
@@ -46,8 +61,7 @@ export async function saveUserData(
       name: node.name,
       color: node.color,
       size: node.size,
-      expanded: metadata[node.id]?.expanded || false,
-      notes: metadata[node.id]?.notes || ''
+      expanded: metadata[node.id]?.expanded || false
     }));
 
     // Clean links - only keep source and target IDs
@@ -56,16 +70,18 @@ export async function saveUserData(
       target: typeof link.target === 'object' ? link.target.id : link.target
     }));
 
+    const { body, headers } = await encodeJsonBody({
+      topics: cleanTopics,
+      relationships: cleanLinks
+    });
+
     const response = await fetch('http://localhost:5001/api/user/topics', {
       method: 'POST',
       headers: {
-        'Content-Type': 'application/json',
+        ...headers,
         'Authorization': `Bearer ${session.access_token}`
       },
-      body: JSON.stringify({
-        topics: cleanTopics,
-        relationships: cleanLinks
-      })
+      body
     });
 
     if (!response.ok) {
@@ -110,9 +126,9 @@ export async function loadUserData() {
 
     const metadata: Record<string, NodeMetadata> = {};
     data.topics.forEach((topic: any) => {
+      // Note bodies are loaded on demand with loadTopicNotes
       metadata[topic.id] = {
-        expanded: topic.expanded,
-        notes: topic.notes
+        expanded: topic.expanded
       };
     });
 
@@ -128,22 +144,116 @@ export async function loadUserData() {
   }
 }
 
-export async function createTopicNewsSummary(topics: string[]): Promise<{ summary_id: string; status: string; message: string }> {
+class NotesConflictError extends Error {
+  constructor(public notes: string, public version: number) {
+    super('Notes were changed since they were loaded');
+  }
+}
+
+export async function loadTopicNotes(topicId: string): Promise<{ notes: string; version: number }> {
   try {
     const { data: { session } } = await supabase.auth.getSession();
     if (!session?.access_token) {
       throw new Error('No valid session');
     }
 
-    const response = await fetch('http://localhost:5001/api/topic-news', {
-      method: 'POST',
+    const response = await fetch(`http://localhost:5001/api/user/topics/${topicId}/notes`, {
+      method: 'GET',
+      headers: {
+        'Authorization': `Bearer ${session.access_token}`
+      }
+    });
+
+    if (!response.ok) {
+      throw new Error(`Failed to load notes: ${response.statusText}`);
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error loading notes:', error);
+    throw error;
+  }
+}
+
+export async function saveTopicNotes(
+  topicId: string,
+  notes: string,
+  version: number
+): Promise<{ notes: string; version: number }> {
+  try {
+    const { data: { session } } = await supabase.auth.getSession();
+    if (!session?.access_token) {
+      throw new Error('No valid session');
+    }
+
+    const response = await fetch(`http://localhost:5001/api/user/topics/${topicId}/notes`, {
+      method: 'PATCH',
       headers: {
         'Content-Type': 'application/json',
         'Authorization': `Bearer ${session.access_token}`
       },
+      body: JSON.stringify({ notes, version })
+    });
+
+    if (response.status === 409) {
+      const current = await response.json();
+      throw new NotesConflictError(current.notes, current.version);
+    }
+
+    if (!response.ok) {
+      throw new Error(`Failed to save notes: ${response.statusText}`);
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error saving notes:', error);
+    throw error;
+  }
+}
+
+export async function prewarmVoiceSession(topic: string): Promise<void> {
+  try {
+    const { data: { session } } = await supabase.auth.getSession();
+    if (!session?.access_token) return;
+
+    await fetch('http://localhost:5001/api/session/prewarm', {
+      method: 'POST',
+      headers: {
+        'Authorization': `Bearer ${session.access_token}`,
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ topic })
+    });
+  } catch (error) {
+    // Prewarming is only an optimization
+    console.error('Error prewarming voice session:', error);
+  }
+}
+
+// Pass the same idempotencyKey for every attempt of one user action; a repeat returns the original summary
+export async function createTopicNewsSummary(
+  topics: string[],
+  idempotencyKey: string = crypto.randomUUID()
+): Promise<{ summary_id: string; status: string; message: string }> {
+  try {
+    const { data: { session } } = await supabase.auth.getSession();
+    if (!session?.access_token) {
+      throw new Error('No valid session');
+    }
+
+    const request = () => fetch('http://localhost:5001/api/topic-news', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${session.access_token}`,
+        'Idempotency-Key': idempotencyKey
+      },
       body: JSON.stringify({ topics })
     });
 
+    // A network failure may hide a request the server did receive; the key makes the retry safe
+    const response = await request().catch(() => request());
+
     if (!response.ok) {
       throw new Error(`Failed to create news summary: ${response.statusText}`);
     }
@@ -205,4 +315,44 @@ export async function listTopicNewsSummaries(): Promise<{ summaries: NewsSummary
   }
 }
 
-export type { GraphNode, NodeMetadata, Link, NewsSummary };
\ No newline at end of file
+interface SearchResult {
+  kind: 'topic' | 'news_summary';
+  id: string;
+  title: string;
+  snippet: string;
+  rank: number;
+  created_at: string;
+}
+
+export async function searchUserContent(
+  query: string,
+  page = 1,
+  perPage = 20
+): Promise<{ results: SearchResult[]; total: number; page: number; per_page: number }> {
+  try {
+    const { data: { session } } = await supabase.auth.getSession();
+    if (!session?.access_token) {
+      throw new Error('No valid session');
+    }
+
+    const params = new URLSearchParams({ q: query, page: String(page), per_page: String(perPage) });
+    const response = await fetch(`http://localhost:5001/api/search?${params}`, {
+      method: 'GET',
+      headers: {
+        'Authorization': `Bearer ${session.access_token}`
+      }
+    });
+
+    if (!response.ok) {
+      throw new Error(`Failed to search: ${response.statusText}`);
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error searching user content:', error);
+    throw error;
+  }
+}
+
+export { NotesConflictError };
+export type { GraphNode, NodeMetadata, Link, NewsSummary, SearchResult };
\ No newline at end of file